@@ -0,0 +1,302 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+"""Benchmarks of the sampling hot path.
+
+Every sensor, then a whole update through SensorManager.get_results(),
+run against the recorded /proc and /sys trees of fixtures/, with the
+nvidia-smi and curl of stubs/ first in the PATH and local servers for
+the public address and connectivity sensors. Nothing needs a panel, a
+GPU or gi, and the user's settings are not touched.
+
+For each sensor and for the whole update it reports the latency, the
+memory allocated (tracemalloc, in a separate pass), the read and write
+syscalls (/proc/self/io) and the stub processes spawned. The start up is
+measured apart: indicator-sysmonitor-cli is run a few times, from the
+process creation to the first label, and its peak RSS is reported.
+
+    python3 benchmarks/bench_sensors.py --save before.json
+    ... change something ...
+    python3 benchmarks/bench_sensors.py --compare before.json
+
+--compare exits with 1 if a mean latency grew by more than --tolerance
+percent.
+"""
+
+import json
+import os
+import resource
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+CLI = os.path.join(os.path.dirname(HERE), 'indicator_sysmonitor', 'indicator-sysmonitor-cli')
+
+SENSORS = ['cpu', 'cpu0', 'cpu//max', 'cpu_steal', 'cpu0_iowait', 'ctxt', 'procs_running',
+           'mem', 'swap', 'net', 'netcomp', 'totalnet', 'simpleNet', 'bat0', 'fs///',
+           'amdgpu', 'amdgpu1', 'nvgpu', 'nvgputemp', 'cputemp', 'cputemp//max',
+           'temp//nvme/Composite', 'upordown', 'latency', 'publicip', 'publiccountry',
+           'publiccountryiso', 'ism_stats', 'bench_script']
+
+
+class _PublicInfoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = json.dumps({'ip': '203.0.113.7', 'country': 'France',
+                           'country_iso': 'FR'}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def setup(workdir):
+    """Points everything to the fixtures and returns the SensorManager
+    and the file counting the stub calls."""
+    forks = os.path.join(workdir, 'forks')
+    open(forks, 'w').close()
+    os.environ['HOME'] = workdir
+    os.environ['PATH'] = os.path.join(HERE, 'stubs') + os.pathsep + os.environ['PATH']
+    os.environ['ISM_BENCH_FORKS'] = forks
+
+    server = HTTPServer(('127.0.0.1', 0), _PublicInfoHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen()
+
+    with open(os.path.join(workdir, '.indicator-sysmonitor.json'), 'w') as f:
+        json.dump({
+            'custom_text': ' '.join('{%s}' % name for name in SENSORS),
+            'interval': 2,
+            'on_startup': False,
+            'sensors': {'bench_script': ['curl stub', 'curl -s https://example.org']},
+            'public_info_url': 'http://127.0.0.1:{}/json'.format(server.server_port),
+            'probe_targets': ['127.0.0.1:{}'.format(listener.getsockname()[1])],
+        }, f)
+
+    from sysmonitor_common.pseudofiles import set_roots
+    set_roots(os.path.join(HERE, 'fixtures', 'proc'), os.path.join(HERE, 'fixtures', 'sys'))
+
+    from sysmonitor_common.sensors import SensorManager
+    mgr = SensorManager()
+    mgr.load_settings()
+    mgr.update_regex()
+    return mgr, forks, (server, listener)
+
+
+def _syscalls():
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(': ') for line in f.read().splitlines())
+        return int(counters['syscr']) + int(counters['syscw'])
+    except (OSError, KeyError, ValueError):
+        return 0
+
+
+def measure(run, iterations, forks):
+    """Runs run() iterations times and returns its statistics."""
+    run()  # warm up: open the files, start the background fetches
+    time.sleep(0.2)
+
+    latencies = []
+    errors = 0
+    fork_count = os.path.getsize(forks)
+    syscalls = _syscalls()
+    for _i in range(iterations):
+        start = time.perf_counter_ns()
+        try:
+            run()
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter_ns() - start)
+    syscalls = _syscalls() - syscalls
+    fork_count = os.path.getsize(forks) - fork_count
+
+    tracemalloc.start()
+    allocated = []
+    for _i in range(min(iterations, 50)):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        try:
+            run()
+        except Exception:
+            pass
+        allocated.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'mean_us': statistics.mean(latencies) / 1000,
+        'p95_us': latencies[int(0.95 * (len(latencies) - 1))] / 1000,
+        'max_us': latencies[-1] / 1000,
+        'alloc_kib': statistics.mean(allocated) / 1024,
+        'syscalls': syscalls / iterations,
+        'forks': fork_count / iterations,
+        'errors': errors,
+    }
+
+
+def bench_sensor(mgr, name):
+    from sysmonitor_common.sources import Snapshot
+
+    mgr.set_custom_text('{%s}' % name)
+    bindings = mgr.get_plan().bindings
+    if not bindings:
+        return None
+
+    binding = bindings[0]
+    sources = binding.sensor.sources if binding.sensor is not None else ()
+
+    def run():
+        snapshot = Snapshot()
+        snapshot.read(sources)
+        binding.render(binding.fetch(snapshot))
+
+    return run
+
+
+def measure_startup(runs):
+    """Runs the command line front end until its first label, runs times,
+    with a fresh interpreter each time. --once is not used: it waits for
+    a second pass."""
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(HERE))
+    latencies = []
+    errors = 0
+    for _i in range(runs):
+        start = time.perf_counter_ns()
+        proc = subprocess.Popen([sys.executable, CLI, '--template', '{cpu} {mem}'],
+                                env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        line = proc.stdout.readline()
+        latencies.append(time.perf_counter_ns() - start)
+        proc.terminate()
+        proc.stdout.close()
+        if proc.wait() not in (0, -signal.SIGTERM) or not line:
+            errors += 1
+
+    latencies.sort()
+    return {
+        'mean_us': statistics.mean(latencies) / 1000,
+        'p95_us': latencies[int(0.95 * (len(latencies) - 1))] / 1000,
+        'max_us': latencies[-1] / 1000,
+        # kilobytes on Linux, the largest of the runs
+        'rss_kib': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        'errors': errors,
+    }
+
+
+def run_benchmarks(iterations, only=None):
+    with tempfile.TemporaryDirectory(prefix='ism-bench-') as workdir:
+        mgr, forks, _servers = setup(workdir)
+        try:
+            return _run_benchmarks(mgr, forks, iterations, only)
+        finally:
+            mgr.shutdown()
+
+
+def _run_benchmarks(mgr, forks, iterations, only):
+    results = {}
+    for name in SENSORS:
+        if only and name not in only:
+            continue
+        run = bench_sensor(mgr, name)
+        if run is None:
+            print("{}: can not be bound, skipped".format(name), file=sys.stderr)
+            continue
+        results[name] = measure(run, iterations, forks)
+
+    # a whole update with every sensor due
+    mgr.set_custom_text(' '.join('{%s}' % name for name in SENSORS))
+    for name in SENSORS:
+        mgr.set_refresh(name, 0)
+
+    def tick():
+        mgr.get_label(mgr.get_results())
+
+    results['tick'] = measure(tick, iterations, forks)
+    return results
+
+
+def print_startup(stats):
+    print("start up: {:.1f}ms mean, {:.1f}ms max, {:.1f} MiB peak RSS, {} errors".format(
+        stats['mean_us'] / 1000, stats['max_us'] / 1000, stats['rss_kib'] / 1024,
+        stats['errors']))
+
+
+def print_results(results, baseline=None):
+    columns = ('mean_us', 'p95_us', 'max_us', 'alloc_kib', 'syscalls', 'forks', 'errors')
+    print('{:<22}'.format('sensor') + ''.join('{:>11}'.format(column) for column in columns))
+    for name, stats in results.items():
+        line = '{:<22}'.format(name) + ''.join('{:>11.1f}'.format(stats[column])
+                                               for column in columns)
+        if baseline is not None and name in baseline and baseline[name]['mean_us']:
+            change = 100 * (stats['mean_us'] / baseline[name]['mean_us'] - 1)
+            line += '  {:+.0f}%'.format(change)
+        print(line)
+
+
+def main():
+    parser = ArgumentParser(description="Benchmarks the sensors against recorded fixtures.")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--sensor', action='append', help="only benchmark this sensor")
+    parser.add_argument('--save', metavar='FILE', help="save the results as a baseline")
+    parser.add_argument('--compare', metavar='FILE', help="compare with a saved baseline")
+    parser.add_argument('--tolerance', type=float, default=20,
+                        help="percent of mean latency growth reported as a regression")
+    parser.add_argument('--startup-runs', type=int, default=5,
+                        help="start ups of the command line front end to time, 0 to skip")
+    options = parser.parse_args()
+
+    # before anything else: the stubs and fixtures are for the sensors only
+    startup = measure_startup(options.startup_runs) if options.startup_runs else None
+    results = run_benchmarks(options.iterations, options.sensor)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+
+    print_results(results, baseline)
+    if startup is not None:
+        print_startup(startup)
+        results['startup'] = startup
+
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if baseline is not None:
+        regressions = [name for name, stats in results.items()
+                       if name in baseline and baseline[name]['mean_us']
+                       and stats['mean_us'] > baseline[name]['mean_us'] * (1 + options.tolerance / 100)]
+        if regressions:
+            print("Slower than the baseline: " + ', '.join(regressions))
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
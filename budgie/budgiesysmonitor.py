@@ -36,12 +36,16 @@ from gi.repository import Budgie, GObject, GLib
 
 from gi.repository import Gtk
 
-from sysmonitor_common.preferences import Preferences
-from sysmonitor_common.preferences import __version__
+from sysmonitor_common.graph import SparklineGraph
+from sysmonitor_common.graph import graph_available
 from sysmonitor_common.sensors import SensorManager
 
 logging.basicConfig(level=logging.INFO)
 
+# ms during which label updates are gathered into a single relayout, about
+# one frame
+LABEL_PUSH_DELAY = 16
+
 HELP_MSG = """<span underline="single" size="x-large">{title}</span>
 
 {introduction}
@@ -81,13 +85,26 @@ CPU {{cpu}} | MEM {{mem}} | root {{fs///}}
 class IndicatorSysmonitor(object):
     SENSORS_DISABLED = False
 
-    def __init__(self):
+    def __init__(self, uuid=None):
+        # every applet shows its own label, sampled along with the others
+        self.subscriber = uuid
         self._preferences_dialog = None
         self._help_dialog = None
 
         self.ind = Gtk.EventBox()
         self.label = Gtk.Label("Init...")
-        self.ind.add(self.label)
+        self.graph_image = Gtk.Image()
+        self.graph_image.set_no_show_all(True)
+        box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=4)
+        box.pack_start(self.graph_image, False, False, 0)
+        box.pack_start(self.label, False, False, 0)
+        self.ind.add(box)
+        self._graph = None
+        self._graph_key = None
+        self._graph_count = None
+        self._label = "Init..."
+        self._pending_label = None
+        self._push_source = None
 
         self._create_menu()
 
@@ -159,18 +176,56 @@ class IndicatorSysmonitor(object):
 
                 data[sensor] = remaining
 
-        label = self.sensor_mgr.get_label(data)
+        self._update_graph()
+        label = self.sensor_mgr.get_label(data, self.subscriber)
+        if not label:
+            return
+
+        # skip unchanged labels and relayout the panel once for a burst
+        # of updates
+        self._pending_label = label.strip()
+        if self._push_source is None and self._pending_label != self._label:
+            self._push_source = GLib.timeout_add(LABEL_PUSH_DELAY, self._push_label)
+
+    def _update_graph(self):
+        settings = self.sensor_mgr.get_graph_settings()
+        if not settings['sensors'] or not graph_available():
+            if self._graph is not None:
+                self._graph = None
+                self._graph_key = None
+                self.graph_image.hide()
+            return
+
+        key = (tuple(settings['sensors']), settings['width'], settings['height'], settings['bars'])
+        if key != self._graph_key:
+            self._graph = SparklineGraph(len(settings['sensors']), settings['width'],
+                                         settings['height'], settings['bars'])
+            self._graph_key = key
+            self.graph_image.show()
+
+        count, values, scales = self.sensor_mgr.get_graph_sample()
+        if count == self._graph_count:
+            return
+
+        # drawn straight from the cairo surface, no file involved
+        self._graph_count = count
+        self._graph.push(values, scales)
+        self.graph_image.set_from_surface(self._graph.surface)
 
+    def _push_label(self):
+        self._push_source = None
+        if self._pending_label != self._label:
+            self._label = self._pending_label
+            self.label.set_text(self._label)
+            self.sensor_mgr.get_stats().first_label()
 
-        def update_label(label):
-            self.label.set_text(label)
-            return False
-        if label and self.label:
-            GLib.idle_add(update_label, label.strip())
+        return False
 
     def load_settings(self):
 
         self.sensor_mgr.load_settings()
+        if self.subscriber is not None:
+            self.sensor_mgr.subscribe(self.subscriber)
         self.sensor_mgr.initiate_fetcher(self)
         self.update_indicator_guide()
 
@@ -189,6 +244,9 @@ class IndicatorSysmonitor(object):
             self._preferences_dialog.present()
             return
 
+        # the preferences are only loaded when they are opened
+        from sysmonitor_common.preferences import Preferences
+
         self._preferences_dialog = Preferences(self)
         self._preferences_dialog.run()
         self._preferences_dialog = None
@@ -201,6 +259,22 @@ class IndicatorSysmonitor(object):
         if GLib.find_program_in_path('gnome-system-monitor') is not None:
             os.system('gnome-system-monitor &')
 
+    def on_removed(self, widget=None):
+        """The applet was removed from its panel: the other applets keep
+        the sampler."""
+        if self._preferences_dialog is not None:
+            self._preferences_dialog.destroy()
+        if self._push_source is not None:
+            GLib.source_remove(self._push_source)
+            self._push_source = None
+
+        running = self.sensor_mgr.release_fetcher(self)
+        if self.subscriber is not None:
+            self.sensor_mgr.unsubscribe(self.subscriber)
+        if not running:
+            # the last applet: stop the commands it left running
+            self.sensor_mgr.shutdown()
+
     def on_exit(self, event=None, data=None):
         """Action call when the main programs is closed."""
         # cleanup temporary indicator icon
@@ -287,7 +361,8 @@ class BudgieSysMonitorApplet(Budgie.Applet):
                     f.write(json.dumps(settings, indent=4, ensure_ascii=False))
                 f.close()
 
-        self.app = IndicatorSysmonitor()
+        self.app = IndicatorSysmonitor(uuid)
+        self.connect('destroy', self.app.on_removed)
         self.button = self.app.ind
         #self.button.set_relief(Gtk.ReliefStyle.NONE)
         self.add(self.button)
@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+import numbers
+
+
+def to_number(raw):
+    """Returns the raw value of a sensor as a float, the sum of the items
+    of a tuple (e.g. download + upload), or None if it is not numeric."""
+    if isinstance(raw, bool):
+        return None
+    if isinstance(raw, numbers.Real):
+        return float(raw)
+    if isinstance(raw, tuple):
+        values = [to_number(item) for item in raw]
+        return None if None in values or not values else sum(values)
+    if isinstance(raw, str):
+        try:
+            return float(raw)
+        except ValueError:
+            return None
+
+    return None
+
+
+class AdaptiveRate(object):
+    """The sampling period of one sensor, following how fast its value
+    moves.
+
+    While every new value stays within the tolerance band of the previous
+    one, the period grows by growth up to max_period. As soon as a value
+    jumps out of the band, or crosses threshold, the period drops to
+    min_period. The band is tolerance times the larger of the two values,
+    but never less than band, so idle noise around 0 does not count as a
+    change."""
+
+    def __init__(self, min_period=1, max_period=30, tolerance=0.1, band=1,
+                 threshold=None, growth=1.5):
+        self.min_period = min_period
+        self.max_period = max_period
+        self.tolerance = tolerance
+        self.band = band
+        self.threshold = threshold
+        self.growth = growth
+        self.period = None
+        self._last = None
+
+    @classmethod
+    def from_settings(cls, cfg):
+        return cls(cfg.get('min', 1), cfg.get('max', 30), cfg.get('tolerance', 0.1),
+                   cfg.get('band', 1), cfg.get('threshold'))
+
+    def update(self, value, period):
+        """Takes the new value of the sensor and returns the period until
+        the next sample; period is the one used when the value is not
+        numeric, and the starting point."""
+        if self.period is None:
+            self.period = min(max(period, self.min_period), self.max_period)
+
+        value = to_number(value)
+        if value is None:
+            return period
+
+        last, self._last = self._last, value
+        if last is None:
+            return self.period
+
+        band = max(self.tolerance * max(abs(last), abs(value)), self.band)
+        crossed = (self.threshold is not None
+                   and (last < self.threshold) != (value < self.threshold))
+        if crossed or abs(value - last) > band:
+            self.period = self.min_period
+        else:
+            self.period = min(self.period * self.growth, self.max_period)
+
+        return self.period
@@ -0,0 +1,375 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+import logging
+import os
+import signal
+import subprocess
+import time
+from gettext import gettext as _
+from threading import Lock
+
+from sysmonitor_common.stats import count_fork
+
+
+def check_output(args, **kwargs):
+    """subprocess.check_output, counted in the sampler statistics."""
+    count_fork()
+    return subprocess.check_output(args, **kwargs)
+
+
+def run_command(command, timeout=None, running=None):
+    """Runs a shell command and returns its stripped stdout as bytes.
+
+    The command gets its own process group so that on timeout the shell
+    and everything it spawned are killed; subprocess.TimeoutExpired is
+    raised in that case. The process is in the set running, if given,
+    while it runs."""
+    count_fork()
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, shell=True,
+                            start_new_session=True)
+    if running is not None:
+        running.add(proc)
+    try:
+        return proc.communicate(timeout=timeout)[0].strip()
+    except subprocess.TimeoutExpired:
+        kill_group(proc)
+        proc.communicate()
+        raise
+    finally:
+        if running is not None:
+            running.discard(proc)
+
+
+def kill_group(proc):
+    """Kills the process group of proc, started in a session of its own."""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+class ScriptStats(object):
+    """Execution counters of one command."""
+
+    def __init__(self):
+        self.runs = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.last = 0.0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, duration):
+        self.runs += 1
+        self.last = duration
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def as_dict(self):
+        return {
+            'runs': self.runs,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'last_ms': self.last * 1e3,
+            'mean_ms': self.total / self.runs * 1e3 if self.runs else 0.0,
+            'max_ms': self.max * 1e3,
+        }
+
+
+class _Entry(object):
+
+    def __init__(self):
+        self.value = None
+        self.running = False
+        self.future = None
+        self.stats = ScriptStats()
+
+
+class ScriptExecutor(object):
+    """Runs custom sensor commands concurrently, up to max_workers at a
+    time, and kills the ones running longer than their timeout.
+
+    get() never waits for a command: it serves the last good output
+    (stale-while-revalidate) and starts a refresh unless one is already
+    running. on_first_value, if set, is called with the command once its
+    very first output is available so that the caller can re-render."""
+
+    def __init__(self, max_workers=4, timeout=10):
+        self.timeout = timeout
+        self.on_first_value = None
+        self._max_workers = max_workers
+        self._pool = None
+        self._lock = Lock()
+        self._entries = {}  # command => _Entry
+        self._running = set()  # Popen of the commands running
+
+    def set_max_workers(self, max_workers):
+        with self._lock:
+            if max_workers == self._max_workers:
+                return
+
+            self._max_workers = max_workers
+            if self._pool is not None:
+                # running commands finish on the old pool
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    def get(self, command, timeout=None):
+        """Returns the last output of command, None if it never completed,
+        and schedules a refresh."""
+        with self._lock:
+            entry = self._entries.get(command)
+            if entry is None:
+                entry = self._entries[command] = _Entry()
+
+            if not entry.running:
+                entry.running = True
+                if self._pool is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self._max_workers,
+                        thread_name_prefix='ScriptExecutor')
+                entry.future = self._pool.submit(self._run, command, entry,
+                                                 self.timeout if timeout is None else timeout)
+
+            return entry.value
+
+    def forget(self, keep):
+        """Drops the cached output of every command not in keep."""
+        with self._lock:
+            for command in list(self._entries):
+                if command not in keep and not self._entries[command].running:
+                    del self._entries[command]
+
+    def runs(self, command):
+        """Returns how many times command was run."""
+        entry = self._entries.get(command)
+        return entry.stats.runs if entry is not None else 0
+
+    def stats(self):
+        """Returns the execution counters of every known command."""
+        with self._lock:
+            return {command: entry.stats.as_dict()
+                    for command, entry in self._entries.items()}
+
+    def shutdown(self):
+        """Drops the queued commands and kills the running ones."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+            for entry in self._entries.values():
+                if entry.future is not None and entry.future.cancel():
+                    entry.running = False
+
+        for proc in list(self._running):
+            kill_group(proc)
+
+    def _run(self, command, entry, timeout):
+        start = time.monotonic()
+        value = None
+        try:
+            output = run_command(command, timeout, self._running)
+            value = output.decode('utf-8') if output else _("(no output)")
+        except subprocess.TimeoutExpired:
+            entry.stats.timeouts += 1
+            if entry.value is None:
+                value = _("Timeout")
+            logging.warning(_("Timeout after {}s running: {}").format(timeout, command))
+        except Exception as ex:
+            entry.stats.errors += 1
+            value = _("Error")
+            logging.error(_("Error running: {}").format(command))
+            logging.debug(ex)
+
+        duration = time.monotonic() - start
+        first = False
+        with self._lock:
+            entry.stats.record(duration)
+            if value is not None:
+                first = entry.value is None
+                entry.value = value
+            entry.running = False
+
+        logging.debug("%s took %.3fs", command, duration)
+        if first and self.on_first_value is not None:
+            self.on_first_value(command)
+
+
+class _Stream(object):
+
+    def __init__(self, command):
+        self.command = command
+        self.proc = None
+        self.buffer = b''
+        self.value = None
+        self.lines = 0
+        self.restarts = 0
+        self.backoff = StreamReader.MIN_BACKOFF
+        self.started_at = 0.0
+        self.restart_at = 0.0
+
+
+class StreamReader(object):
+    """Keeps long running commands alive and remembers the last line each
+    of them printed.
+
+    A streaming command is started once and is expected to print one line
+    per update (vmstat 1, tail -f, nvidia-smi -l...). A single thread
+    multiplexes the stdout of every command with a selector, so reading
+    never blocks the sampler. A command that exits is restarted with an
+    exponential backoff, which is reset once it stayed up for a while."""
+
+    MIN_BACKOFF = 1
+    MAX_BACKOFF = 60
+
+    def __init__(self):
+        self._lock = Lock()
+        self._streams = {}  # command => _Stream
+        self._selector = None
+        self._thread = None
+        self._wake_r = self._wake_w = None
+
+    def get(self, command):
+        """Returns the last line printed by command, None if none yet, and
+        starts the command if it is not running."""
+        with self._lock:
+            stream = self._streams.get(command)
+            if stream is None:
+                stream = self._streams[command] = _Stream(command)
+                self._ensure_thread()
+                self._wake()
+
+            return stream.value
+
+    def sync(self, commands):
+        """Stops every command not in commands."""
+        with self._lock:
+            stale = [command for command in self._streams if command not in commands]
+            for command in stale:
+                self._kill(self._streams.pop(command))
+            if stale:
+                self._wake()
+
+    def stats(self):
+        with self._lock:
+            return {command: {'lines': stream.lines, 'restarts': stream.restarts}
+                    for command, stream in self._streams.items()}
+
+    def shutdown(self):
+        self.sync(())
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+
+        import selectors
+        from threading import Thread
+
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._thread = Thread(target=self._loop, name='StreamReader', daemon=True)
+        self._thread.start()
+
+    def _wake(self):
+        if self._wake_w is not None:
+            try:
+                os.write(self._wake_w, b'x')
+            except BlockingIOError:
+                pass
+
+    def _start(self, stream):
+        import selectors
+
+        count_fork()
+        try:
+            stream.proc = subprocess.Popen(stream.command, stdout=subprocess.PIPE,
+                                           stdin=subprocess.DEVNULL, shell=True,
+                                           start_new_session=True)
+        except OSError as ex:
+            logging.error(_("Error running: {}").format(stream.command))
+            logging.debug(ex)
+            self._backoff(stream)
+            return
+
+        stream.started_at = time.monotonic()
+        os.set_blocking(stream.proc.stdout.fileno(), False)
+        self._selector.register(stream.proc.stdout, selectors.EVENT_READ, stream)
+
+    def _kill(self, stream):
+        proc, stream.proc = stream.proc, None
+        if proc is None:
+            return
+
+        try:
+            self._selector.unregister(proc.stdout)
+        except (KeyError, ValueError):
+            pass
+        kill_group(proc)
+        proc.stdout.close()
+        proc.wait()
+
+    def _backoff(self, stream):
+        now = time.monotonic()
+        if now - stream.started_at > self.MAX_BACKOFF:
+            stream.backoff = self.MIN_BACKOFF
+
+        stream.restarts += 1
+        stream.restart_at = now + stream.backoff
+        logging.warning(_("{} exited, restarting in {}s").format(stream.command, stream.backoff))
+        stream.backoff = min(stream.backoff * 2, self.MAX_BACKOFF)
+
+    def _read(self, stream):
+        try:
+            chunk = os.read(stream.proc.stdout.fileno(), 65536)
+        except BlockingIOError:
+            return
+
+        if not chunk:
+            self._kill(stream)
+            self._backoff(stream)
+            return
+
+        lines = (stream.buffer + chunk).split(b'\n')
+        stream.buffer = lines.pop()[-65536:]
+        lines = [line for line in lines if line.strip()]
+        if lines:
+            stream.value = lines[-1].decode('utf-8', 'replace').strip()
+            stream.lines += len(lines)
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                timeout = None
+                for stream in self._streams.values():
+                    if stream.proc is None:
+                        if stream.restart_at <= now:
+                            self._start(stream)
+                        else:
+                            wait = stream.restart_at - now
+                            timeout = wait if timeout is None else min(timeout, wait)
+
+            for key, _events in self._selector.select(timeout):
+                if key.data is None:
+                    try:
+                        while os.read(self._wake_r, 512):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                with self._lock:
+                    # the stream may have been stopped meanwhile
+                    if key.data.proc is not None and key.data.proc.stdout is key.fileobj:
+                        self._read(key.data)
@@ -0,0 +1,264 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+import json
+import logging
+import os
+import selectors
+import socket
+import time
+from threading import Lock
+from threading import Thread
+
+# bytes queued for a client that does not read before it is dropped
+MAX_BUFFER = 1 << 20
+
+
+def socket_path():
+    """The export socket, in the user's runtime directory."""
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if directory and os.path.isdir(directory):
+        return os.path.join(directory, 'indicator-sysmonitor.sock')
+
+    return os.path.join(os.environ.get('TMPDIR', '/tmp'),
+                        'indicator-sysmonitor-{}.sock'.format(os.getuid()))
+
+
+def fetch_snapshot(path=None, timeout=1):
+    """Returns the latest snapshot of a running indicator, as a dict with
+    time, label, values (rendered) and raw; raises OSError if there is
+    none."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or socket_path())
+        sock.sendall(b'get\n')
+        with sock.makefile('rb') as f:
+            line = f.readline()
+
+    if not line:
+        raise ConnectionError("no snapshot")
+
+    return json.loads(line.decode('utf-8'))
+
+
+class _Client(object):
+    __slots__ = ('sock', 'inbuf', 'outbuf', 'subscribed', 'last')
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.inbuf = b''
+        self.outbuf = b''
+        self.subscribed = False
+        self.last = None  # the last snapshot sent
+
+
+class MetricsServer(object):
+    """Serves the sampler's latest snapshot on a Unix socket, so that
+    other programs reuse the indicator's sampling instead of reading /proc
+    on their own.
+
+    A client sends commands, one per line, and gets JSON objects, one per
+    line: get answers the latest snapshot, subscribe the latest snapshot
+    then every new one. The snapshot is encoded once per pass, and only
+    if some client wants it. Everything runs on one thread with
+    non-blocking sockets; a client not reading its updates is dropped."""
+
+    def __init__(self, path=None):
+        self.path = path or socket_path()
+        self._lock = Lock()
+        self._snapshot = None
+        self._payload = None  # the snapshot as a JSON line, once encoded
+        self._clients = {}  # socket => _Client
+        self._selector = None
+        self._listener = None
+        self._wakeup = None
+        self._thread = None
+
+    def start(self):
+        """Listens on path; returns False if another indicator already
+        does."""
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                # left over by an indicator that did not exit cleanly
+                os.unlink(self.path)
+            else:
+                logging.warning("%s is served by another process", self.path)
+                return False
+            finally:
+                probe.close()
+
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            self._listener.bind(self.path)
+        finally:
+            os.umask(umask)
+        self._listener.listen()
+        self._listener.setblocking(False)
+
+        # written to by publish() and stop() to wake the selector up
+        self._wakeup = socket.socketpair()
+        for sock in self._wakeup:
+            sock.setblocking(False)
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._listener, selectors.EVENT_READ)
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ)
+        self._thread = Thread(target=self._run, name='MetricsServer', daemon=True)
+        self._thread.start()
+        logging.info("Serving the sensors on %s", self.path)
+        return True
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        thread, self._thread = self._thread, None
+        self._poke()
+        thread.join(1)
+
+    def publish(self, values, raw, label):
+        """Makes values (rendered) and raw the latest snapshot."""
+        with self._lock:
+            self._snapshot = (time.time(), values, raw, label)
+            self._payload = None
+
+        self._poke()
+
+    def _poke(self):
+        try:
+            self._wakeup[1].send(b'\0')
+        except (BlockingIOError, OSError):
+            # already pending, or stopped
+            pass
+
+    def _encode(self):
+        with self._lock:
+            if self._payload is None and self._snapshot is not None:
+                now, values, raw, label = self._snapshot
+                self._payload = (json.dumps({
+                    'time': now,
+                    'label': label,
+                    'values': values,
+                    'raw': raw,
+                }, default=str, ensure_ascii=False) + '\n').encode('utf-8')
+
+            return self._payload
+
+    def _run(self):
+        try:
+            while self._thread is not None:
+                for key, events in self._selector.select():
+                    if key.fileobj is self._listener:
+                        self._accept()
+                    elif key.fileobj is self._wakeup[0]:
+                        try:
+                            while self._wakeup[0].recv(4096):
+                                pass
+                        except BlockingIOError:
+                            pass
+                    else:
+                        client = self._clients.get(key.fileobj)
+                        if client is not None:
+                            if events & selectors.EVENT_READ:
+                                self._read(client)
+                            if events & selectors.EVENT_WRITE and client.sock in self._clients:
+                                self._flush(client)
+
+                payload = self._encode() if any(
+                    client.subscribed for client in self._clients.values()) else None
+                if payload is not None:
+                    for client in list(self._clients.values()):
+                        if client.subscribed and client.last is not payload:
+                            client.last = payload
+                            self._send(client, payload)
+        finally:
+            self._close()
+
+    def _accept(self):
+        try:
+            sock, _addr = self._listener.accept()
+        except OSError:
+            return
+
+        sock.setblocking(False)
+        self._clients[sock] = _Client(sock)
+        self._selector.register(sock, selectors.EVENT_READ)
+
+    def _read(self, client):
+        try:
+            data = client.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._drop(client)
+            return
+
+        client.inbuf += data
+        while b'\n' in client.inbuf:
+            line, client.inbuf = client.inbuf.split(b'\n', 1)
+            command = line.strip().decode('utf-8', 'replace')
+            if command in ('get', 'subscribe'):
+                client.subscribed = client.subscribed or command == 'subscribe'
+                payload = self._encode()
+                if payload is not None:
+                    client.last = payload
+                    self._send(client, payload)
+            elif command:
+                self._send(client, (json.dumps({'error': 'unknown command: ' + command})
+                                    + '\n').encode('utf-8'))
+
+        if len(client.inbuf) > 4096:
+            self._drop(client)
+
+    def _send(self, client, payload):
+        if client.sock not in self._clients:
+            return
+        if len(client.outbuf) + len(payload) > MAX_BUFFER:
+            logging.warning("Dropping a metrics client which does not read")
+            self._drop(client)
+            return
+
+        client.outbuf += payload
+        self._flush(client)
+
+    def _flush(self, client):
+        try:
+            count = client.sock.send(client.outbuf)
+        except BlockingIOError:
+            count = 0
+        except OSError:
+            self._drop(client)
+            return
+
+        client.outbuf = client.outbuf[count:]
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if client.outbuf else 0)
+        self._selector.modify(client.sock, events)
+
+    def _drop(self, client):
+        if self._clients.pop(client.sock, None) is not None:
+            self._selector.unregister(client.sock)
+            client.sock.close()
+
+    def _close(self):
+        for client in list(self._clients.values()):
+            self._drop(client)
+        self._selector.close()
+        self._listener.close()
+        for sock in self._wakeup:
+            sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,142 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+import os
+import tempfile
+from collections import deque
+
+cairo = None  # imported by graph_available(), only when a graph is drawn
+
+GRAPH_DEFAULTS = {
+    'sensors': [],  # sensors drawn in the icon, none to disable the graph
+    'width': 32,
+    'height': 22,
+    'bars': False,  # bars instead of lines
+}
+
+# one colour per sensor, drawn over each other in this order
+COLORS = [
+    (1.0, 1.0, 1.0),
+    (0.45, 0.75, 1.0),
+    (1.0, 0.6, 0.2),
+    (0.5, 0.9, 0.4),
+]
+
+
+def graph_available():
+    global cairo
+    if cairo is None:
+        try:
+            import cairo
+        except ImportError:
+            return False
+
+    return True
+
+
+class SparklineGraph(object):
+    """A small scrolling graph of the last values of a few sensors, one
+    pixel column per sample.
+
+    A new sample scrolls the previous image by one column, into the
+    second of two surfaces, and draws only the new column. The whole
+    image is redrawn only when the scale of an autoscaled series changes.
+    surface is the image to show; it is not modified until the next
+    push() but the one after reuses it."""
+
+    def __init__(self, series, width=32, height=22, bars=False):
+        if not graph_available():
+            raise ImportError("pycairo is needed to draw the graph")
+
+        self.width = width
+        self.height = height
+        self.bars = bars
+        self._values = [deque(maxlen=width) for _ in range(series)]
+        self._scales = [None] * series
+        self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        self._back = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+
+    def push(self, values, scales):
+        """Adds a sample: values holds one number, or None, per series and
+        scales their full scale, e.g. 100 for a percentage, or None to
+        scale them on the highest visible value."""
+        redraw = False
+        for index, (value, scale) in enumerate(zip(values, scales)):
+            self._values[index].append(value)
+            if scale is None:
+                scale = max((value for value in self._values[index] if value is not None),
+                            default=0) or 1
+            if scale != self._scales[index]:
+                self._scales[index] = scale
+                redraw = True
+
+        surface, self._back = self._back, self.surface
+        ctx = cairo.Context(surface)
+        ctx.set_operator(cairo.OPERATOR_SOURCE)
+        if redraw:
+            ctx.set_source_rgba(0, 0, 0, 0)
+            ctx.paint()
+            columns = range(max(len(values) for values in self._values))
+        else:
+            ctx.set_source_surface(self._back, -1, 0)
+            ctx.paint()
+            ctx.rectangle(self.width - 1, 0, 1, self.height)
+            ctx.set_source_rgba(0, 0, 0, 0)
+            ctx.fill()
+            columns = (-1,)
+
+        ctx.set_operator(cairo.OPERATOR_OVER)
+        for column in columns:
+            self._draw_column(ctx, column)
+
+        surface.flush()
+        self.surface = surface
+
+    def write_png(self, path):
+        self.surface.write_to_png(path)
+
+    def _y(self, index, value):
+        ratio = min(max(value / self._scales[index], 0), 1)
+        return self.height - ratio * (self.height - 1) - 0.5
+
+    def _draw_column(self, ctx, column):
+        # column is an index in the series, negative from the newest one;
+        # the newest sample is drawn in the last pixel column
+        for index, values in enumerate(self._values):
+            if column < 0:
+                position = len(values) + column
+            else:
+                position = column
+            if position < 0 or position >= len(values) or values[position] is None:
+                continue
+
+            x = self.width - len(values) + position
+            ctx.set_source_rgba(*COLORS[index % len(COLORS)], 0.8)
+            y = self._y(index, values[position])
+            if self.bars:
+                ctx.rectangle(x, y, 1, self.height - y)
+                ctx.fill()
+            elif position > 0 and values[position - 1] is not None:
+                ctx.set_line_width(1)
+                ctx.move_to(x - 0.5, self._y(index, values[position - 1]))
+                ctx.line_to(x + 0.5, y)
+                ctx.stroke()
+            else:
+                ctx.rectangle(x, y - 0.5, 1, 1)
+                ctx.fill()
+
+
+def icon_paths():
+    """Two file names to write the graph icon to in turn, in memory when
+    /dev/shm is there: the indicator reloads its icon only when the name
+    changes. They are in a private directory created for the process, so
+    that no other user can put a symlink in their place."""
+    directory = tempfile.mkdtemp(prefix='indicator-sysmonitor-',
+                                 dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    return [os.path.join(directory, 'graph0.png'), os.path.join(directory, 'graph1.png')]
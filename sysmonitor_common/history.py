@@ -0,0 +1,230 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+import bisect
+import re
+from array import array
+from collections import deque
+
+from sysmonitor_common.adaptive import to_number
+
+# {sensor:avg60}, {sensor:max5m}, {sensor:p95}, {sensor:p95_10m}: the
+# aggregate and an optional window, in seconds unless followed by m or h.
+# Without a window the aggregate covers the whole history.
+_modifier_regex = re.compile(r'\A(avg|min|max|p(\d{1,2}))(?:_?(\d+)([smh]?))?\Z')
+_units = {'': 1, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_modifier(modifier):
+    """Returns (kind, window) for a modifier such as 'avg60', kind being
+    'avg', 'min', 'max' or a percentile between 0 and 99, window a number
+    of seconds or None; returns None if the modifier is not valid."""
+    match = _modifier_regex.match(modifier)
+    if match is None:
+        return None
+
+    kind = int(match.group(2)) if match.group(2) else match.group(1)
+    window = None
+    if match.group(3):
+        window = int(match.group(3)) * _units[match.group(4)]
+        if window <= 0:
+            return None
+
+    return kind, window
+
+
+def split_placeholder(name):
+    """Splits 'sensor:modifier' into ('sensor', 'modifier'); names without
+    a valid modifier are returned whole, as (name, None)."""
+    base, sep, modifier = name.rpartition(':')
+    if sep and base and parse_modifier(modifier) is not None:
+        return base, modifier
+
+    return name, None
+
+
+def to_components(raw):
+    """Returns a raw value as a tuple of floats, e.g. (download, upload)
+    for the network sensors, or None if it is not numeric."""
+    if isinstance(raw, tuple):
+        values = tuple(to_number(item) for item in raw)
+        return None if not values or None in values else values
+
+    value = to_number(raw)
+    return None if value is None else (value,)
+
+
+class _Mean(object):
+    __slots__ = ('total', 'count')
+
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, seq, value):
+        self.total += value
+        self.count += 1
+
+    def evict(self, seq, value):
+        self.count -= 1
+        self.total = self.total - value if self.count else 0.0
+
+    def value(self):
+        return self.total / self.count if self.count else None
+
+
+class _Extreme(object):
+    """Minimum or maximum of a sliding window: a monotonic deque of
+    (seq, value) whose head is the answer."""
+    __slots__ = ('maximum', 'items')
+
+    def __init__(self, maximum):
+        self.maximum = maximum
+        self.items = deque()
+
+    def add(self, seq, value):
+        items = self.items
+        if self.maximum:
+            while items and items[-1][1] <= value:
+                items.pop()
+        else:
+            while items and items[-1][1] >= value:
+                items.pop()
+        items.append((seq, value))
+
+    def evict(self, seq, value):
+        if self.items and self.items[0][0] == seq:
+            self.items.popleft()
+
+    def value(self):
+        return self.items[0][1] if self.items else None
+
+
+class _Percentile(object):
+    """Percentile of a sliding window, over the window's values kept
+    sorted: adding or evicting a value is a binary search then a move
+    of the array's tail, O(n) but a single memmove of doubles."""
+    __slots__ = ('percentile', 'values')
+
+    def __init__(self, percentile):
+        self.percentile = percentile
+        self.values = array('d')
+
+    def add(self, seq, value):
+        bisect.insort(self.values, value)
+
+    def evict(self, seq, value):
+        del self.values[bisect.bisect_left(self.values, value)]
+
+    def value(self):
+        if not self.values:
+            return None
+
+        index = round(self.percentile / 100 * (len(self.values) - 1))
+        return self.values[index]
+
+
+def _new_aggregate(kind):
+    if kind == 'avg':
+        return _Mean()
+    if kind in ('min', 'max'):
+        return _Extreme(kind == 'max')
+
+    return _Percentile(kind)
+
+
+class SensorHistory(object):
+    """The last size samples of a sensor, in a ring of array('d'), and
+    the aggregates of its modifiers.
+
+    Each aggregate is updated when a sample enters or leaves its window,
+    so a sample costs O(1) per aggregate whatever the window, except for
+    percentiles whose sorted array is O(n) to update. A window can not reach further back than the
+    ring: the oldest samples leave every window when they are
+    overwritten. Samples with several components, like the download and
+    upload rates, are aggregated component by component; scalar tells
+    the sensor gives plain numbers rather than tuples."""
+
+    def __init__(self, size, width=1, scalar=True):
+        self.size = size
+        self.width = width
+        self.scalar = scalar
+        self.count = 0  # number of samples pushed so far
+        self._times = array('d', bytes(8 * size))
+        self._values = array('d', bytes(8 * size * width))
+        self._windows = {}  # window => [start seq, {kind: [aggregate per component]}]
+        self._modifiers = {}  # modifier => (kind, window)
+
+    def add_modifier(self, modifier):
+        if modifier in self._modifiers:
+            return
+
+        kind, window = self._modifiers[modifier] = parse_modifier(modifier)
+        start, aggregates = self._windows.setdefault(
+            window, [max(self.count - self.size, 0), {}])
+        if kind not in aggregates:
+            aggregates[kind] = [_new_aggregate(kind) for _ in range(self.width)]
+            # aggregate what the window already holds
+            for seq in range(start, self.count):
+                for component, aggregate in enumerate(aggregates[kind]):
+                    aggregate.add(seq, self._value(seq, component))
+
+            if window is not None and self.count:
+                self._trim(window, self._times[(self.count - 1) % self.size])
+
+    def push(self, now, values):
+        """Adds a sample, a tuple of width floats taken at now."""
+        seq = self.count
+        if seq >= self.size:
+            # the oldest sample is about to be overwritten
+            self._evict(seq - self.size)
+
+        slot = seq % self.size
+        self._times[slot] = now
+        self._values[slot * self.width:(slot + 1) * self.width] = array('d', values)
+        self.count += 1
+
+        for window, state in self._windows.items():
+            for aggregates in state[1].values():
+                for component, aggregate in enumerate(aggregates):
+                    aggregate.add(seq, values[component])
+
+            if window is not None:
+                self._trim(window, now)
+
+    def get(self, modifier):
+        """Returns the aggregate of modifier as a tuple, None if there is
+        no sample in its window."""
+        kind, window = self._modifiers[modifier]
+        aggregates = self._windows[window][1][kind]
+        values = tuple(aggregate.value() for aggregate in aggregates)
+        return None if None in values else values
+
+    def _value(self, seq, component):
+        return self._values[(seq % self.size) * self.width + component]
+
+    def _trim(self, window, now):
+        # samples older than the window leave it
+        state = self._windows[window]
+        start = state[0]
+        while start < self.count - 1 and self._times[start % self.size] < now - window:
+            self._evict_from(state, start)
+            start += 1
+        state[0] = start
+
+    def _evict(self, seq):
+        for state in self._windows.values():
+            if state[0] <= seq:
+                self._evict_from(state, seq)
+                state[0] = seq + 1
+
+    def _evict_from(self, state, seq):
+        for aggregates in state[1].values():
+            for component, aggregate in enumerate(aggregates):
+                aggregate.evict(seq, self._value(seq, component))
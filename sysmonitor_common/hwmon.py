@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+import logging
+import os
+import re
+from collections import namedtuple
+from threading import Lock
+
+from sysmonitor_common.pseudofiles import host_path
+from sysmonitor_common.pseudofiles import read_file
+
+# one temperature input: chip is the hwmon name (coretemp, k10temp,
+# nvme...) or 'thermal' for thermal zones, label its tempN_label, or tempN
+# if it has none, or the zone type
+TempInput = namedtuple('TempInput', ['chip', 'label', 'path'])
+
+# (chip, label) of the inputs that are the cpu package, best first
+CPU_INPUTS = [
+    ('coretemp', 'Package id 0'),
+    ('k10temp', 'Tctl'),
+    ('k10temp', 'Tdie'),
+    ('zenpower', 'Tctl'),
+    ('zenpower', 'Tdie'),
+    ('cpu_thermal', None),
+    ('thermal', 'x86_pkg_temp'),
+    ('thermal', 'cpu-thermal'),
+    ('thermal', 'cpu_thermal'),
+]
+
+_temp_input_regex = re.compile(r'\Atemp(\d+)_input\Z')
+
+
+class TemperatureIndex(object):
+    """Index of every hwmon and thermal zone temperature input of the
+    machine, with their chip name and label.
+
+    The index is built by scan(), at first use and on explicit rescans, so
+    that finding an input costs a dict lookup instead of walking sysfs on
+    every sample. Inputs are looked up with a spec:
+
+      ''             the cpu package, see CPU_INPUTS
+      'label'        the first input with that label, e.g. 'Package id 0'
+      'chip/label'   e.g. 'k10temp/Tctl', 'nvme/Composite'
+      'chip'         the first input of that chip
+      'max'          every input, to take the hottest one
+    """
+
+    def __init__(self, root=None):
+        self.root = root if root is not None else host_path('/sys/class')
+        self._lock = Lock()
+        self._inputs = None  # [TempInput]
+        self._by_key = {}
+
+    def scan(self):
+        inputs = self._scan_hwmon() + self._scan_thermal()
+
+        by_key = {}
+        for temp in inputs:
+            for key in ((temp.chip, temp.label), (temp.chip, None), (None, temp.label)):
+                by_key.setdefault(key, temp)
+
+        with self._lock:
+            self._inputs = inputs
+            self._by_key = by_key
+
+        logging.info("Found %d temperature inputs", len(inputs))
+        return inputs
+
+    def inputs(self):
+        if self._inputs is None:
+            self.scan()
+
+        return self._inputs
+
+    def find(self, spec=''):
+        """Returns the list of TempInput matching spec, [] if none."""
+        inputs = self.inputs()
+        if spec == 'max':
+            return list(inputs)
+
+        if not spec:
+            for key in CPU_INPUTS:
+                if key in self._by_key:
+                    return [self._by_key[key]]
+
+            # like we always did: the first zone, else the first hwmon
+            for temp in sorted(inputs, key=lambda temp: temp.chip != 'thermal'):
+                return [temp]
+
+            return []
+
+        chip, sep, label = spec.partition('/')
+        if sep:
+            key = (chip, label)
+        elif (spec, None) in self._by_key:
+            key = (spec, None)
+        else:
+            key = (None, spec)
+
+        temp = self._by_key.get(key)
+        return [temp] if temp is not None else []
+
+    def _scan_hwmon(self):
+        inputs = []
+        base = os.path.join(self.root, 'hwmon')
+        try:
+            hwmons = sorted(os.listdir(base))
+        except OSError:
+            return inputs
+
+        for hwmon in hwmons:
+            hwmon = os.path.join(base, hwmon)
+            try:
+                chip = read_file(os.path.join(hwmon, 'name'))
+                files = os.listdir(hwmon)
+            except OSError:
+                continue
+
+            numbers = sorted(int(match.group(1)) for match in map(_temp_input_regex.match, files)
+                             if match)
+            for number in numbers:
+                try:
+                    label = read_file(os.path.join(hwmon, 'temp{}_label'.format(number)))
+                except OSError:
+                    label = 'temp{}'.format(number)
+
+                inputs.append(TempInput(chip, label,
+                                        os.path.join(hwmon, 'temp{}_input'.format(number))))
+
+        return inputs
+
+    def _scan_thermal(self):
+        inputs = []
+        base = os.path.join(self.root, 'thermal')
+        try:
+            zones = [zone for zone in os.listdir(base) if zone.startswith('thermal_zone')]
+        except OSError:
+            return inputs
+
+        for zone in sorted(zones, key=lambda zone: int(zone[12:] or 0)):
+            zone = os.path.join(base, zone)
+            try:
+                label = read_file(os.path.join(zone, 'type'))
+            except OSError:
+                continue
+
+            inputs.append(TempInput('thermal', label, os.path.join(zone, 'temp')))
+
+        return inputs
+
+
+_index = None
+
+
+def temperature_index():
+    """Returns the TemperatureIndex shared by the sensors."""
+    global _index
+    if _index is None:
+        _index = TemperatureIndex()
+
+    return _index
@@ -0,0 +1,253 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+import logging
+import socket
+import struct
+from threading import Event
+from threading import Lock
+from threading import Thread
+
+NETLINK_ROUTE = 0
+
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_ROUTE = 0x400
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+RTM_GETROUTE = 26
+
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+
+IFLA_IFNAME = 3
+RTA_OIF = 4
+RTA_PRIORITY = 6
+RTA_TABLE = 15
+
+RT_TABLE_MAIN = 254
+RTN_UNICAST = 1
+
+IFF_UP = 0x1
+IFF_LOWER_UP = 0x10000
+
+NLMSGHDR = struct.Struct('=LHHLL')  # len, type, flags, seq, pid
+IFINFOMSG = struct.Struct('=BxHiII')  # family, type, index, flags, change
+RTMSG = struct.Struct('=BBBBBBBBI')  # family, dst_len, src_len, tos, table,
+                                     # protocol, scope, type, flags
+RTATTR = struct.Struct('=HH')  # len, type
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def parse_attributes(data, offset, end):
+    """Returns the rtattr of a message found between offset and end
+    as a dict type => raw bytes."""
+    attributes = {}
+    while offset + RTATTR.size <= end:
+        length, type_ = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+
+        attributes[type_] = data[offset + RTATTR.size:offset + length]
+        offset += _align(length)
+
+    return attributes
+
+
+def dump_request(msg_type, seq, family=socket.AF_UNSPEC):
+    """Builds the request dumping every link or route."""
+    if msg_type == RTM_GETLINK:
+        body = IFINFOMSG.pack(family, 0, 0, 0, 0)
+    else:
+        body = RTMSG.pack(family, 0, 0, 0, 0, 0, 0, 0, 0)
+
+    return NLMSGHDR.pack(NLMSGHDR.size + len(body), msg_type,
+                         NLM_F_REQUEST | NLM_F_DUMP, seq, 0) + body
+
+
+class RouteState(object):
+    """What the kernel told us about the links and default routes.
+
+    feed() takes raw rtnetlink messages, from a dump or a notification,
+    and keeps the state up to date. It has no socket of its own so it can
+    be fed with recorded or hand made messages."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.links = {}  # index => (name, up)
+        self.default_routes = {}  # (family, oif, priority) => oif
+
+    def feed(self, data):
+        """Applies every message of data; returns False once the end of a
+        dump is reached, True otherwise."""
+        offset = 0
+        more = True
+        with self._lock:
+            while offset + NLMSGHDR.size <= len(data):
+                length, msg_type, _flags, _seq, _pid = NLMSGHDR.unpack_from(data, offset)
+                if length < NLMSGHDR.size:
+                    break
+
+                body = offset + NLMSGHDR.size
+                end = min(offset + length, len(data))
+                if msg_type in (RTM_NEWLINK, RTM_DELLINK):
+                    self._on_link(msg_type, data, body, end)
+                elif msg_type in (RTM_NEWROUTE, RTM_DELROUTE):
+                    self._on_route(msg_type, data, body, end)
+                elif msg_type in (NLMSG_DONE, NLMSG_ERROR):
+                    more = False
+
+                offset += _align(length)
+
+        return more
+
+    def clear(self):
+        with self._lock:
+            self.links.clear()
+            self.default_routes.clear()
+
+    def _on_link(self, msg_type, data, offset, end):
+        _family, _type, index, flags, _change = IFINFOMSG.unpack_from(data, offset)
+        if msg_type == RTM_DELLINK:
+            self.links.pop(index, None)
+            return
+
+        attributes = parse_attributes(data, offset + IFINFOMSG.size, end)
+        name = attributes.get(IFLA_IFNAME, b'').rstrip(b'\0').decode('utf-8', 'replace')
+        if not name and index in self.links:
+            name = self.links[index][0]
+
+        up = bool(flags & IFF_UP) and bool(flags & IFF_LOWER_UP)
+        self.links[index] = (name, up)
+
+    def _on_route(self, msg_type, data, offset, end):
+        (family, dst_len, _src_len, _tos, table, _protocol, _scope,
+         route_type, _flags) = RTMSG.unpack_from(data, offset)
+        if dst_len != 0 or route_type != RTN_UNICAST:
+            return
+
+        attributes = parse_attributes(data, offset + RTMSG.size, end)
+        if RTA_TABLE in attributes:
+            table = struct.unpack('=I', attributes[RTA_TABLE][:4])[0]
+        if table != RT_TABLE_MAIN or RTA_OIF not in attributes:
+            return
+
+        oif = struct.unpack('=i', attributes[RTA_OIF][:4])[0]
+        priority = 0
+        if RTA_PRIORITY in attributes:
+            priority = struct.unpack('=I', attributes[RTA_PRIORITY][:4])[0]
+
+        key = (family, oif, priority)
+        if msg_type == RTM_DELROUTE:
+            self.default_routes.pop(key, None)
+        else:
+            self.default_routes[key] = oif
+
+    def default_iface(self):
+        """The interface of the preferred default route, IPv4 first,
+        lowest metric first, or None if there is none."""
+        with self._lock:
+            routes = sorted(self.default_routes,
+                            key=lambda key: (key[0] != socket.AF_INET, key[2]))
+            for _family, oif, _priority in routes:
+                if oif in self.links:
+                    return self.links[oif][0]
+
+        return None
+
+    def is_connected(self):
+        """True if a default route goes through a link that is up."""
+        with self._lock:
+            return any(self.links.get(oif, (None, False))[1]
+                       for oif in self.default_routes.values())
+
+
+class NetlinkMonitor(Thread):
+    """Learns the links and default routes once from the kernel, then
+    follows its link and route notifications. Nothing is polled and no
+    process is spawned.
+
+    sock may be given instead of opening an rtnetlink socket, for instance
+    a socketpair end fed with recorded messages."""
+
+    def __init__(self, state=None, sock=None):
+        Thread.__init__(self, name='NetlinkMonitor', daemon=True)
+        self.state = state if state is not None else RouteState()
+        self.ready = Event()
+        self._sock = sock
+
+    def open(self):
+        if self._sock is None:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_CLOEXEC,
+                                 NETLINK_ROUTE)
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_ROUTE | RTMGRP_IPV6_ROUTE))
+            self._sock = sock
+
+        # dump one table at a time, the kernel refuses overlapping dumps
+        for seq, msg_type in enumerate((RTM_GETLINK, RTM_GETROUTE), 1):
+            self._sock.send(dump_request(msg_type, seq))
+            while True:
+                data = self._sock.recv(65536)
+                if not data or not self.state.feed(data):
+                    break
+
+        self.ready.set()
+
+    def run(self):
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except OSError as ex:
+                # e.g. ENOBUFS when notifications were dropped: start over
+                logging.warning("netlink: %s, reloading", ex)
+                try:
+                    self.state.clear()
+                    self.open()
+                except OSError:
+                    logging.exception("netlink monitor stopped")
+                    return
+                continue
+
+            if not data:
+                return
+
+            self.state.feed(data)
+
+
+_monitor = None
+_monitor_lock = Lock()
+
+
+def network_state():
+    """Returns the RouteState kept up to date by the shared monitor, or
+    None if rtnetlink is not available or the monitor stopped: its state
+    would then be stale, or empty after a failed reload."""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            monitor = NetlinkMonitor()
+            try:
+                monitor.open()
+            except (OSError, AttributeError) as ex:
+                logging.warning("netlink not available: %s", ex)
+                _monitor = False
+            else:
+                monitor.start()
+                _monitor = monitor
+
+    return _monitor.state if _monitor and _monitor.is_alive() else None
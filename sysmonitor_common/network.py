@@ -0,0 +1,286 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+import errno
+import json
+import logging
+import select
+import socket
+import time
+from threading import Event
+from threading import Lock
+from threading import Thread
+from urllib.parse import urlsplit
+
+from sysmonitor_common.netlink import network_state
+
+PUBLIC_INFO_URL = 'https://ifconfig.co/json'
+
+# host:port reached by the connectivity probe, addresses need no DNS lookup
+PROBE_TARGETS = ['1.1.1.1:53', '8.8.8.8:53']
+
+
+class PublicInfo(object):
+    """The public ip address, country and country ISO code, fetched with a
+    single HTTP request shared by all the public* sensors.
+
+    The endpoint must answer a JSON object with 'ip', 'country' and
+    'country_iso' keys, like https://ifconfig.co/json does. get() never
+    waits for the network: it serves the cached answer and starts a
+    refresh on a background thread once it is older than ttl seconds.
+    Failed requests, or refreshes while there is no default route, are
+    retried after a delay doubling from min_backoff up to ttl. The
+    connection is kept alive between two refreshes.
+
+    on_update, if set, is called after every successful refresh."""
+
+    def __init__(self, url=PUBLIC_INFO_URL, ttl=600, timeout=10, min_backoff=15):
+        self.url = url
+        self.ttl = ttl
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.on_update = None
+        self._lock = Lock()
+        self._data = None
+        self._expires = 0
+        self._backoff = min_backoff
+        self._running = False
+        self._conn = None
+        self._conn_key = None
+
+    def set_url(self, url):
+        with self._lock:
+            if url != self.url:
+                self.url = url
+                self._data = None
+                self._expires = 0
+
+    def get(self, key):
+        """Returns the cached value of key, None if unknown yet."""
+        with self._lock:
+            if not self._running and time.monotonic() >= self._expires:
+                self._running = True
+                Thread(target=self._refresh, name='PublicInfo', daemon=True).start()
+
+            return self._data.get(key) if self._data else None
+
+    def _refresh(self):
+        try:
+            data = self._request()
+        except Exception as ex:
+            with self._lock:
+                self._expires = time.monotonic() + self._backoff
+                logging.warning("Public network info unavailable (%s), retrying in %ss",
+                                ex, self._backoff)
+                self._backoff = min(self._backoff * 2, self.ttl)
+                self._running = False
+            return
+
+        with self._lock:
+            self._data = data
+            self._expires = time.monotonic() + self.ttl
+            self._backoff = self.min_backoff
+            self._running = False
+
+        if self.on_update is not None:
+            self.on_update()
+
+    def _connection(self, parts):
+        # http.client pulls in ssl and email: imported on the first request
+        import http.client
+
+        key = (parts.scheme, parts.netloc)
+        if self._conn is None or self._conn_key != key:
+            self._close()
+            if parts.scheme == 'https':
+                self._conn = http.client.HTTPSConnection(parts.netloc, timeout=self.timeout)
+            else:
+                self._conn = http.client.HTTPConnection(parts.netloc, timeout=self.timeout)
+            self._conn_key = key
+
+        return self._conn
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _request(self):
+        import http.client
+
+        state = network_state()
+        if state is not None and not state.is_connected():
+            raise IOError("no default route")
+
+        parts = urlsplit(self.url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        for attempt in (1, 2):
+            conn = self._connection(parts)
+            try:
+                conn.request('GET', path, headers={'Accept': 'application/json',
+                                                   'User-Agent': 'indicator-sysmonitor'})
+                response = conn.getresponse()
+                body = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # the server may have closed the kept alive connection
+                self._close()
+                if attempt == 2:
+                    raise
+
+        if response.will_close:
+            self._close()
+        if response.status != 200:
+            raise IOError("HTTP {} {}".format(response.status, response.reason))
+
+        data = json.loads(body.decode('utf-8'))
+        return {key: str(data[key]) for key in ('ip', 'country', 'country_iso') if key in data}
+
+
+_public_info = None
+
+
+def public_info():
+    """Returns the PublicInfo shared by the sensors."""
+    global _public_info
+    if _public_info is None:
+        _public_info = PublicInfo()
+
+    return _public_info
+
+
+def parse_target(target):
+    """Splits 'host:port' or '[ipv6]:port' into (host, port)."""
+    host, sep, port = target.rpartition(':')
+    if not sep or not port.isdigit():
+        raise ValueError("invalid probe target: {}".format(target))
+
+    return host.strip('[]'), int(port)
+
+
+class ConnectivityProbe(object):
+    """Tells whether the internet is reachable, and how fast, by opening a
+    TCP connection to a few targets at once. The first target to answer,
+    even with a refusal, proves the network is up and gives the latency.
+
+    Probes run on a background thread. The delay between two probes
+    starts at min_interval after every change of state and doubles up to
+    max_interval while the state is stable. Without a default route the
+    network is down and nothing is probed.
+
+    on_update, if set, is called after every probe."""
+
+    def __init__(self, targets=None, timeout=2, min_interval=5, max_interval=60):
+        self.targets = list(PROBE_TARGETS if targets is None else targets)
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.on_update = None
+        self.up = None
+        self.latency = None
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._thread = None
+
+    def set_targets(self, targets):
+        self.targets = list(targets)
+        self._wakeup.set()
+
+    def get(self):
+        """Returns (up, latency in seconds) of the last probe, up is None
+        before the first one and latency None while down."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='ConnectivityProbe', daemon=True)
+                self._thread.start()
+
+            return self.up, self.latency
+
+    def _run(self):
+        interval = self.min_interval
+        while True:
+            up, latency = self.probe()
+            with self._lock:
+                changed = up != self.up
+                self.up, self.latency = up, latency
+
+            if changed:
+                interval = self.min_interval
+            else:
+                interval = min(interval * 2, self.max_interval)
+
+            if self.on_update is not None:
+                self.on_update()
+
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+
+    def probe(self):
+        """Probes the targets once and returns (up, latency)."""
+        state = network_state()
+        if state is not None and not state.is_connected():
+            return False, None
+
+        start = time.monotonic()
+        pending = []
+        try:
+            for target in self.targets:
+                try:
+                    host, port = parse_target(target)
+                    family, _type, _proto, _name, address = socket.getaddrinfo(
+                        host, port, type=socket.SOCK_STREAM)[0]
+                    sock = socket.socket(family, socket.SOCK_STREAM | socket.SOCK_NONBLOCK
+                                         | socket.SOCK_CLOEXEC)
+                except (OSError, ValueError) as ex:
+                    logging.warning("probe %s: %s", target, ex)
+                    continue
+
+                error = sock.connect_ex(address)
+                if error == errno.EINPROGRESS:
+                    pending.append(sock)
+                    continue
+
+                sock.close()
+                if error in (0, errno.ECONNREFUSED):
+                    return True, time.monotonic() - start
+
+            deadline = start + self.timeout
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                _readable, writable, _errors = select.select([], pending, [], remaining)
+                for sock in writable:
+                    error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if error in (0, errno.ECONNREFUSED):
+                        return True, time.monotonic() - start
+
+                    pending.remove(sock)
+                    sock.close()
+
+            return False, None
+        finally:
+            for sock in pending:
+                sock.close()
+
+
+_probe = None
+
+
+def connectivity_probe():
+    """Returns the ConnectivityProbe shared by the sensors."""
+    global _probe
+    if _probe is None:
+        _probe = ConnectivityProbe()
+
+    return _probe
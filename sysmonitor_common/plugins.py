@@ -0,0 +1,225 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+import importlib.util
+import logging
+import os
+import sys
+import time
+from gettext import gettext as _
+from threading import Lock
+
+from sysmonitor_common.template import Binding
+
+PLUGIN_DIR = os.path.join(os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config'),
+                          'indicator-sysmonitor', 'plugins')
+ENTRY_POINT_GROUP = 'indicator_sysmonitor.sensors'
+
+# consecutive calls over the budget after which a plugin is disabled
+MAX_OVERRUNS = 3
+
+
+def _entry_points():
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return []
+
+    try:
+        return list(entry_points(group=ENTRY_POINT_GROUP))
+    except TypeError:
+        # before python 3.10
+        return list(entry_points().get(ENTRY_POINT_GROUP, ()))
+
+
+class _PluginState(object):
+    __slots__ = ('overruns', 'disabled', 'broken')
+
+    def __init__(self):
+        self.overruns = 0
+        self.disabled = False
+        self.broken = False  # raised while created, checked or bound
+
+
+class PluginRegistry(object):
+    """Sensors written in Python, run in the indicator's process: no
+    process is spawned to sample them.
+
+    A plugin is a module of the plugin directory, a file such as cpufan.py, or an
+    entry point of ENTRY_POINT_GROUP named cpufan, pointing to a module
+    or a sensor class. The module defines subclasses of base, the
+    BaseSensor of the built-in sensors. Nothing is imported before a
+    placeholder starts with the plugin's name: {cpufan} or {cpufan1}
+    load cpufan, whose classes then check() the placeholder like the
+    built-in sensors do.
+
+    The sampler can not interrupt a plugin, so it must return quickly,
+    leaving anything slow to a thread of its own. A call lasting more
+    than the budget is an overrun; after MAX_OVERRUNS in a row the
+    sensor class is disabled until the indicator restarts. A class
+    raising anything but error while created, checked or bound is
+    left out the same way, its placeholders being unsupported."""
+
+    def __init__(self, base, error, directory=PLUGIN_DIR):
+        self.base = base
+        self.error = error  # raised by check() for a placeholder it rejects
+        self.directory = directory
+        self.budget = 0.01  # seconds
+        self._lock = Lock()
+        self._plugins = None  # name => path of the module or entry point
+        self._classes = {}  # name => sensor classes, once loaded
+        self._states = {}  # sensor class => _PluginState
+
+    def discover(self):
+        """Lists the plugins, without importing them."""
+        plugins = {}
+        for entry_point in _entry_points():
+            plugins[entry_point.name] = entry_point
+
+        try:
+            files = sorted(os.listdir(self.directory))
+        except OSError:
+            files = []
+        for filename in files:
+            name, ext = os.path.splitext(filename)
+            if ext == '.py' and name.isidentifier():
+                # the user's directory wins over the installed packages
+                plugins[name] = os.path.join(self.directory, filename)
+
+        self._plugins = plugins
+        self._classes.clear()
+
+    def classes(self, sensor):
+        """Returns the sensor classes of the plugins whose name is a
+        prefix of sensor, loading them if needed."""
+        with self._lock:
+            if self._plugins is None:
+                self.discover()
+
+            res = []
+            for name, plugin in self._plugins.items():
+                if sensor.startswith(name):
+                    if name not in self._classes:
+                        self._classes[name] = self._load(name, plugin)
+                    res.extend(self._classes[name])
+
+            return res
+
+    def is_plugin(self, sensor_class):
+        return sensor_class in self._states
+
+    def instantiate(self, sensor_class):
+        """Returns an instance of sensor_class, None if it is broken."""
+        state = self._states[sensor_class]
+        if not state.broken:
+            try:
+                return sensor_class()
+            except Exception as ex:
+                self._broken(sensor_class, state, ex)
+
+        return None
+
+    def check(self, sensor, name):
+        """sensor.check(name), False if the plugin is broken."""
+        state = self._states[type(sensor)]
+        if not state.broken:
+            try:
+                return sensor.check(name)
+            except self.error:
+                raise
+            except Exception as ex:
+                self._broken(type(sensor), state, ex)
+
+        return False
+
+    def bind(self, sensor, name):
+        """The guarded binding of sensor for name, None if the plugin is
+        broken."""
+        state = self._states[type(sensor)]
+        if not state.broken:
+            try:
+                return self.guard(sensor.bind(name))
+            except Exception as ex:
+                self._broken(type(sensor), state, ex)
+
+        return None
+
+    def _broken(self, sensor_class, state, ex):
+        state.broken = True
+        logging.exception(ex)
+        logging.error(_("Plugin sensor {} disabled: it raised an error").format(
+            sensor_class.__name__))
+
+    def guard(self, binding):
+        """Wraps the binding of a plugin sensor to time its calls against
+        the budget."""
+        if binding is None:
+            return None
+
+        state = self._states[type(binding.sensor)]
+        fetch = binding.fetch
+        render = binding.render
+        disabled = _("(disabled)")
+
+        def guarded_fetch(snapshot):
+            if state.disabled:
+                return disabled
+
+            start = time.monotonic()
+            try:
+                return fetch(snapshot)
+            finally:
+                if time.monotonic() - start > self.budget:
+                    self._overrun(binding.sensor, state)
+                else:
+                    state.overruns = 0
+
+        def guarded_render(raw):
+            return disabled if raw is disabled else render(raw)
+
+        return Binding(binding.name, binding.sensor, guarded_fetch, guarded_render)
+
+    def _overrun(self, sensor, state):
+        state.overruns += 1
+        if state.overruns >= MAX_OVERRUNS and not state.disabled:
+            state.disabled = True
+            logging.error(_("Plugin sensor {} disabled: more than {}ms per call").format(
+                type(sensor).__name__, self.budget * 1000))
+
+    def _load(self, name, plugin):
+        try:
+            if isinstance(plugin, str):
+                spec = importlib.util.spec_from_file_location(
+                    'indicator_sysmonitor_plugin_' + name, plugin)
+                module = importlib.util.module_from_spec(spec)
+                sys.modules[spec.name] = module
+                spec.loader.exec_module(module)
+                loaded = module
+            else:
+                loaded = plugin.load()
+        except Exception as ex:
+            logging.exception(ex)
+            logging.error(_("Loading the plugin {} failed").format(name))
+            return []
+
+        if isinstance(loaded, type):
+            classes = [loaded] if issubclass(loaded, self.base) else []
+        else:
+            classes = [obj for obj in vars(loaded).values()
+                       if isinstance(obj, type) and issubclass(obj, self.base)
+                       and obj.__module__ == loaded.__name__ and obj.name]
+        if not classes:
+            logging.error(_("The plugin {} defines no sensor").format(name))
+
+        for sensor_class in classes:
+            self._states[sensor_class] = _PluginState()
+
+        logging.info("Plugin %s loaded: %s", name,
+                     ', '.join(sensor_class.__name__ for sensor_class in classes))
+        return classes
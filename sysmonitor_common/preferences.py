@@ -11,7 +11,6 @@
 #
 
 import shutil
-import re
 import logging
 import os
 from gettext import gettext as _
@@ -24,6 +23,7 @@ sys.path.insert(0, '/usr/share/indicator-sysmonitor')
 
 from sysmonitor_common.sensors import SensorManager
 from sysmonitor_common.sensors import ISMError
+from sysmonitor_common.template import SENSORS_REGEX
 
 
 __version__ = '0.11.0'
@@ -222,7 +222,7 @@ class Preferences(Gtk.Dialog):
     AUTOSTART_PATH = '{}/.config/autostart/indicator-sysmonitor.desktop' \
         .format(os.getenv("HOME"))
     DESKTOP_PATH = '/usr/share/applications/indicator-sysmonitor.desktop'
-    sensors_regex = re.compile("{.+?}")
+    sensors_regex = SENSORS_REGEX
 
     SETTINGS_FILE = os.getenv("HOME") + '/.cache/indicator-sysmonitor/preferences.json'
     settings = {}
@@ -378,7 +378,7 @@ class Preferences(Gtk.Dialog):
         except ValueError:
             raise ISMError(_("Interval value is not valid."))
 
-        self.sensor_mgr.set_custom_text(custom_text)
+        self.sensor_mgr.set_custom_text(custom_text, self.ind_parent.subscriber)
         self.sensor_mgr.set_interval(interval)
         # settings["custom_text"] = custom_text
         # settings["interval"] = interval
@@ -388,7 +388,7 @@ class Preferences(Gtk.Dialog):
 
     def set_data(self):
         """It sets the widgets with the config data."""
-        self.custom_entry.set_text(self.sensor_mgr.get_custom_text())
+        self.custom_entry.set_text(self.sensor_mgr.get_custom_text(self.ind_parent.subscriber))
         self.interval_entry.set_text(str(self.sensor_mgr.get_interval()))
 
     def update_autostart(self):
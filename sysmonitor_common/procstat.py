@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+from array import array
+from operator import sub
+
+from sysmonitor_common.pseudofiles import get_file
+from sysmonitor_common.rates import CounterRate
+
+# the columns of the cpu lines of /proc/stat, guest time being already
+# counted in user and nice
+CPU_FIELDS = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal')
+_WIDTH = len(CPU_FIELDS)
+_IDLE = CPU_FIELDS.index('idle')
+_IOWAIT = CPU_FIELDS.index('iowait')
+
+# the counters of /proc/stat turned into rates, by line
+COUNTERS = {b'ctxt': 'ctxt', b'intr': 'intr', b'processes': 'forks'}
+
+
+class ProcStat(object):
+    """The CPU time breakdown and the scheduler counters of /proc/stat,
+    read once per sampling pass for every sensor using them.
+
+    The cpu lines are parsed into one flat array of counters, a row of
+    CPU_FIELDS for all the CPUs then one per core. The deltas since the
+    previous read are computed over the whole array at once and turned
+    into percentages of each row's elapsed time, in an array kept from
+    one read to the next. The first read would cover the time since boot:
+    it only primes the counters, the percentages are None and the rates
+    missing until the next one."""
+
+    def __init__(self):
+        self.cores = 0
+        self.ready = False  # whether percent covers the last interval
+        self.percent = array('d')  # rows of CPU_FIELDS, in percent
+        self.rates = {}  # 'ctxt', 'intr', 'forks' => per second
+        self.procs_running = 0
+        self.procs_blocked = 0
+        self._previous = array('d')
+        self._counters = CounterRate()
+
+    def update(self, now=None):
+        fields = []
+        counters = {}
+        for line in get_file('/proc/stat').read().splitlines():
+            if line.startswith(b'cpu'):
+                values = line.split(None, _WIDTH + 1)[1:_WIDTH + 1]
+                # steal is missing from very old kernels
+                fields.extend(values + [b'0'] * (_WIDTH - len(values)))
+                continue
+
+            key, _sep, rest = line.partition(b' ')
+            if key in COUNTERS:
+                # intr is followed by the count of every interrupt
+                counters[COUNTERS[key]] = int(rest.split(None, 1)[0])
+            elif key == b'procs_running':
+                self.procs_running = int(rest)
+            elif key == b'procs_blocked':
+                self.procs_blocked = int(rest)
+
+        current = array('d', map(float, fields))
+        self.ready = len(current) == len(self.percent)
+        if not self.ready:
+            # first read, or a CPU went on or off line
+            self.cores = len(current) // _WIDTH - 1
+            self.percent = array('d', bytes(8 * len(current)))
+        else:
+            deltas = array('d', map(sub, current, self._previous))
+            percent = self.percent
+            for row in range(0, len(deltas), _WIDTH):
+                # per cpu counters such as iowait may go backwards
+                row_deltas = [delta if delta > 0 else 0.0 for delta in deltas[row:row + _WIDTH]]
+                total = sum(row_deltas)
+                if total:
+                    # otherwise no clock tick elapsed: keep the previous values
+                    scale = 100 / total
+                    percent[row:row + _WIDTH] = array('d', [delta * scale for delta in row_deltas])
+
+        first = not self._previous
+        self._previous = current
+        rates = self._counters.update(counters, now)
+        self.rates = {} if first else rates
+        return self
+
+    def get(self, index, core=None):
+        """Returns the percentage of CPU_FIELDS[index], of every CPU or of
+        core, None before the second read."""
+        if not self.ready:
+            return None
+
+        return self.percent[(0 if core is None else core + 1) * _WIDTH + index]
+
+    def busy(self, core=None):
+        """Percentage of time neither idle nor waiting for I/O, None
+        before the second read."""
+        if not self.ready:
+            return None
+
+        row = (0 if core is None else core + 1) * _WIDTH
+        return 100 - self.percent[row + _IDLE] - self.percent[row + _IOWAIT]
+
+    def busiest(self):
+        """Returns the busy percentage of the busiest core."""
+        if not self.ready:
+            return None
+
+        return max((self.busy(core) for core in range(self.cores)), default=self.busy())
+
+
+_proc_stat = None
+
+
+def proc_stat():
+    """Returns the ProcStat shared by the sensors."""
+    global _proc_stat
+    if _proc_stat is None:
+        _proc_stat = ProcStat()
+
+    return _proc_stat
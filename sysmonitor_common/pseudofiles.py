@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+import os
+from threading import Lock
+
+import psutil as ps
+
+# where procfs and sysfs are read from: the benchmarks point them to
+# recorded trees, see set_roots()
+_roots = {'/proc': '/proc', '/sys': '/sys'}
+
+
+def set_roots(proc='/proc', sys='/sys'):
+    """Reads procfs from proc and sysfs from sys instead of the real ones,
+    psutil included. To be called before the sensors are bound, as the
+    files opened so far are dropped."""
+    _roots['/proc'] = proc
+    _roots['/sys'] = sys
+    ps.PROCFS_PATH = proc
+    with _files_lock:
+        for pseudo_file in _files.values():
+            pseudo_file.close()
+        _files.clear()
+
+
+def host_path(path):
+    """Maps a /proc or /sys path to where they are read from."""
+    for root in ('/proc', '/sys'):
+        if path == root or path.startswith(root + '/'):
+            return _roots[root] + path[len(root):]
+
+    return path
+
+
+class PseudoFile(object):
+    """A procfs or sysfs file kept open between reads.
+
+    Every read is a single pread at offset 0 into a buffer reused from one
+    read to the next, which the kernel answers with fresh content, instead
+    of an open/read/close sequence. The file is reopened only after a
+    failed read, e.g. when the device behind it went away and came back."""
+
+    def __init__(self, path, size=4096):
+        self.path = path
+        self._fd = None
+        self._buffer = bytearray(size)
+
+    def read(self):
+        """Returns the current content of the file as bytes."""
+        try:
+            return self._read()
+        except OSError:
+            # stale handle: the device may have been replaced, try again
+            # once with a fresh one before giving up
+            self.close()
+            return self._read()
+
+    def read_text(self):
+        return self.read().decode('utf-8', 'replace')
+
+    def read_int(self):
+        return int(self.read())
+
+    def close(self):
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _read(self):
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDONLY | os.O_CLOEXEC)
+
+        while True:
+            size = os.preadv(self._fd, [self._buffer], 0)
+            if size < len(self._buffer):
+                return bytes(memoryview(self._buffer)[:size])
+
+            # the content may not fit, read it again with a larger buffer
+            self._buffer = bytearray(2 * len(self._buffer))
+
+    def __del__(self):
+        self.close()
+
+
+_files = {}  # path => PseudoFile
+_files_lock = Lock()
+
+
+def get_file(path):
+    """Returns the shared PseudoFile of path."""
+    pseudo_file = _files.get(path)
+    if pseudo_file is None:
+        with _files_lock:
+            pseudo_file = _files.setdefault(path, PseudoFile(host_path(path)))
+
+    return pseudo_file
+
+
+def read_file(path):
+    """Returns the content of a procfs or sysfs file as a stripped string,
+    keeping the file open for the next read."""
+    return get_file(path).read_text().strip()
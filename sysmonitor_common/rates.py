@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+import time
+
+
+class CounterRate(object):
+    """Turns monotonic counters (bytes, packets...) into per second rates.
+
+    Every counter is tracked on its own, keyed by anything hashable such
+    as (interface, direction), and its rate is computed over the time
+    that really elapsed between two updates, taken from time.monotonic().
+    Counters that appear get a rate of 0 until their next update, those
+    that disappear are forgotten, so interfaces coming and going never
+    produce spikes or negative rates. A counter going backwards is either
+    a wrap, when wrap (the counter modulus, e.g. 2 ** 32) is given and the
+    jump is large enough, or a reset, which also gives a rate of 0.
+
+    smoothing, between 0 and 1, turns on an exponentially weighted moving
+    average: the weight of the newest rate, 1 meaning no smoothing."""
+
+    def __init__(self, smoothing=None, wrap=None):
+        self.smoothing = smoothing
+        self.wrap = wrap
+        self._counters = {}  # key => last counter value
+        self._rates = {}  # key => last rate
+        self._last = None
+
+    def update(self, counters, now=None):
+        """Takes a mapping of key => counter value and returns a dict of
+        key => rate per second for every key of counters."""
+        if now is None:
+            now = time.monotonic()
+
+        elapsed = now - self._last if self._last is not None else 0
+        if elapsed <= 0 and self._last is not None:
+            # same instant, nothing new to tell
+            return {key: self._rates.get(key, 0.0) for key in counters}
+
+        alpha = self.smoothing
+        rates = {}
+        measured = {}  # rates really computed, the ones worth smoothing
+        for key, value in counters.items():
+            last = self._counters.get(key)
+            if last is None or elapsed <= 0:
+                rates[key] = 0.0
+                continue
+
+            delta = value - last
+            if delta < 0:
+                if self.wrap and last - value > self.wrap // 2:
+                    delta += self.wrap
+                else:
+                    delta = 0
+
+            rate = delta / elapsed
+            if alpha is not None and key in self._rates:
+                rate = alpha * rate + (1 - alpha) * self._rates[key]
+
+            rates[key] = measured[key] = rate
+
+        self._counters = dict(counters)
+        self._rates = measured
+        self._last = now
+        return rates
+
+    def reset(self):
+        self._counters = {}
+        self._rates = {}
+        self._last = None
@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+import heapq
+import time
+
+
+class SensorScheduler(object):
+    """Keeps the next refresh deadline of every sensor in a heap so that
+    a sampling pass only touches the sensors that are actually due.
+
+    Deadlines are taken from time.monotonic(). Rescheduling a key simply
+    pushes a new entry; outdated entries are skipped when they surface."""
+
+    def __init__(self):
+        self._heap = []  # (deadline, key)
+        self._deadlines = {}  # key => deadline
+
+    def sync(self, keys, now=None):
+        """Makes the schedule match the given keys: new keys are due at
+        once, keys that are gone are forgotten."""
+        if now is None:
+            now = time.monotonic()
+
+        keys = set(keys)
+        for key in list(self._deadlines):
+            if key not in keys:
+                del self._deadlines[key]
+
+        for key in keys:
+            if key not in self._deadlines:
+                self._push(key, now)
+
+        if len(self._heap) > 4 * len(self._deadlines) + 16:
+            self._heap = [(deadline, key) for key, deadline in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def due(self, now=None):
+        """Pops and returns the keys whose deadline has passed."""
+        if now is None:
+            now = time.monotonic()
+
+        keys = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) == deadline:
+                del self._deadlines[key]
+                keys.append(key)
+
+        return keys
+
+    def reschedule(self, key, period, now=None):
+        """Schedules key to be due again period seconds after now."""
+        if now is None:
+            now = time.monotonic()
+
+        self._push(key, now + period)
+
+    def make_due(self, key):
+        """Makes key due at once."""
+        self._push(key, time.monotonic())
+
+    def reset(self):
+        """Makes every known key due at once."""
+        now = time.monotonic()
+        for key in list(self._deadlines):
+            self._push(key, now)
+
+    def next_deadline(self):
+        """The earliest pending deadline or None if nothing is scheduled."""
+        while self._heap:
+            deadline, key = self._heap[0]
+            if self._deadlines.get(key) == deadline:
+                return deadline
+            heapq.heappop(self._heap)
+
+        return None
+
+    def _push(self, key, deadline):
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
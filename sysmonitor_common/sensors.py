@@ -13,26 +13,62 @@ import json
 import time
 from threading import Thread
 from threading import Event
-import subprocess
-import copy
+from threading import Lock
+from threading import current_thread
 import logging
 import re
 import os
-import platform
+from functools import partial
 from gettext import gettext as _
-from gi.repository import GLib
 
 import psutil as ps
 
+from sysmonitor_common.adaptive import AdaptiveRate
+from sysmonitor_common.adaptive import to_number
+from sysmonitor_common.executor import ScriptExecutor
+from sysmonitor_common.executor import StreamReader
+from sysmonitor_common.executor import check_output
+from sysmonitor_common.executor import run_command
+from sysmonitor_common.graph import GRAPH_DEFAULTS
+from sysmonitor_common.history import SensorHistory
+from sysmonitor_common.history import split_placeholder
+from sysmonitor_common.history import to_components
+from sysmonitor_common.hwmon import temperature_index
+from sysmonitor_common.netlink import network_state
+from sysmonitor_common.network import PROBE_TARGETS
+from sysmonitor_common.network import PUBLIC_INFO_URL
+from sysmonitor_common.network import connectivity_probe
+from sysmonitor_common.network import public_info
+from sysmonitor_common.plugins import PluginRegistry
+from sysmonitor_common.procstat import CPU_FIELDS
+from sysmonitor_common.pseudofiles import get_file
+from sysmonitor_common.pseudofiles import host_path
+from sysmonitor_common.pseudofiles import read_file
+from sysmonitor_common.rates import CounterRate
+from sysmonitor_common.scheduler import SensorScheduler
+from sysmonitor_common.sources import Snapshot
+from sysmonitor_common.stats import SamplerStats
+from sysmonitor_common.stats import forks
+from sysmonitor_common.template import Binding
+from sysmonitor_common.template import LabelPlan
+
 ps_v1_api = int(ps.__version__.split('.')[0]) <= 1
 
 
 B_UNITS = ['B', 'KB', 'MB', 'GB', 'TB', 'PB', 'EB', 'ZB']
-cpu_load = []
+# custom commands starting with this are kept running and
+# the label shows the last line they printed
+STREAM_PREFIX = 'STREAM:'
 
 def get_default_iface():
+    """Returns the interface of the default route, None if there is none."""
+    state = network_state()
+    if state is not None:
+        return state.default_iface()
+
+    # no rtnetlink, ask ip
     try:
-        out = subprocess.check_output(
+        out = check_output(
             "ip route show default",
             shell=True
         ).decode()
@@ -74,36 +110,106 @@ class SensorManager(object):
             'on_startup': False,
             'sensors': {
                 # 'name' => (desc, cmd)
+            },
+            'refresh': {
+                # 'sensor' => seconds between two samples
+            },
+            # icon graph, see graph.GRAPH_DEFAULTS
+            'graph': {},
+            # seconds between two debug log lines of sampler statistics, 0
+            # for none
+            'stats_log_interval': 0,
+            # samples kept per sensor for the {sensor:avg60} like modifiers
+            'history_size': 3600,
+            'adaptive': {
+                # 'sensor', or '*' for all => {'min': seconds, 'max': seconds,
+                # 'tolerance': 0.1, 'band': 1, 'threshold': None}
+            },
+            'script_timeout': 10,
+            'script_concurrency': 4,
+            'script_timeouts': {
+                # 'sensor' => seconds before a custom command is killed
+            },
+            # weight of the newest sample in the network rates, None or 1
+            # for no smoothing
+            'rate_smoothing': None,
+            # JSON endpoint of the public* sensors, see network.PublicInfo
+            'public_info_url': PUBLIC_INFO_URL,
+            # 'host:port' reached by the upordown and latency sensors
+            'probe_targets': PROBE_TARGETS,
+            # seconds a plugin sensor may take per sample, see
+            # plugins.PluginRegistry
+            'plugin_budget': 0.01,
+            # serve the sensors to other programs, see export.MetricsServer
+            'export_socket': False,
+            # write their numeric values to shared memory, see shm.SharedPage
+            'export_page': False,
+            'applets': {
+                # Budgie applet uuid => its own custom_text
             }
         }
 
         supported_sensors = None
 
         def __init__(self):
-            self.sensor_instances = [CPUSensor(),
-                                     AmdGpuSensor(),
-                                     AmdGpu1Sensor(),
-                                     NvGPUSensor(),
-                                     MemSensor(),
-                                     NetSensor(),
-                                     NetCompSensor(),
-                                     SimpleNetSensor(),
-                                     TotalNetSensor(),
-                                     BatSensor(),
-                                     FSSensor(),
-                                     SwapSensor(),
-                                     UporDownSensor(),
-                                     PublicCountrySensor(),
-                                     PublicCountryISOCodeSensor(),
-                                     PublicIPSensor(),
-                                     CPUTemp(),
-                                     NvGPUTemp()]
-
-            for sensor in self.sensor_instances:
+            # the sensors are instantiated when a label first refers to
+            # them, see _sensors()
+            self.sensor_classes = [CPUSensor,
+                                   CPUTimesSensor,
+                                   ProcStatSensor,
+                                   AmdGpuSensor,
+                                   AmdGpu1Sensor,
+                                   NvGPUSensor,
+                                   MemSensor,
+                                   NetSensor,
+                                   NetCompSensor,
+                                   SimpleNetSensor,
+                                   TotalNetSensor,
+                                   BatSensor,
+                                   FSSensor,
+                                   SwapSensor,
+                                   UporDownSensor,
+                                   LatencySensor,
+                                   PublicCountrySensor,
+                                   PublicCountryISOCodeSensor,
+                                   PublicIPSensor,
+                                   CPUTemp,
+                                   TempSensor,
+                                   NvGPUTemp,
+                                   IsmStatsSensor]
+            self._instances = {}  # sensor class => instance
+            self._plugins = PluginRegistry(BaseSensor, ISMError)
+
+            for sensor in self.sensor_classes:
                 self.settings['sensors'][sensor.name] = (sensor.desc, sensor.cmd)
 
-            self._last_net_usage = [0, 0]  # (up, down)
             self._fetcher = None
+            self._last_results = {}
+            self._values = {}
+            self._plan = None
+            self._subscribers = set()  # see subscribe()
+            self._label_plans = {}  # subscriber => LabelPlan of its own label
+            self._bindings = {}  # name => Binding, of the plan being sampled
+            self._sampled_plan = None
+            self._scheduler = SensorScheduler()
+            self._adaptive = {}  # name => AdaptiveRate
+            self._modifiers = {}  # name => modifiers used in the plan
+            self._history = {}  # name => SensorHistory
+            self._graph_sample = (0, [], [])
+            self._raw = {}  # name => last raw value
+            self._failing = set()  # names of the sensors whose last fetch raised
+            self._stats = SamplerStats()
+            self._stats.scripts = self.get_script_stats
+            self._stats_logged = time.monotonic()
+            self._export = None  # MetricsServer, see set_export()
+            self._page = None  # SharedPage, see set_export_page()
+            self._sample_lock = Lock()
+            self._executor = ScriptExecutor(self.settings['script_concurrency'],
+                                            self.settings['script_timeout'])
+            self._executor.on_first_value = self._on_script_done
+            self._streams = StreamReader()
+            public_info().on_update = partial(self._wake_sensors, PublicIPSensor)
+            connectivity_probe().on_update = partial(self._wake_sensors, UporDownSensor)
 
         # @staticmethod
         @classmethod
@@ -122,21 +228,49 @@ class SensorManager(object):
             :return: the sensor instance
             """
 
-            for sensor in self.sensor_instances:
+            for sensor in self._sensors(name, self.sensor_classes):
                 if sensor.check(name):
                     return sensor
 
+            # only then are the plugins named like a prefix of name loaded
+            for sensor in self._sensors(name, self._plugins.classes(name)):
+                if self._plugins.check(sensor, name):
+                    return sensor
+
             return None
 
+        def _sensors(self, name, sensor_classes):
+            """The sensors whose name pattern matches name, instantiated on
+            first use."""
+            for sensor_class in sensor_classes:
+                if re.match(r"\A(?:{})\Z".format(sensor_class.name), name):
+                    sensor = self._instances.get(sensor_class)
+                    if sensor is None:
+                        if self._plugins.is_plugin(sensor_class):
+                            sensor = self._plugins.instantiate(sensor_class)
+                            if sensor is None:
+                                continue
+                        else:
+                            sensor = sensor_class()
+                        self._instances[sensor_class] = sensor
+                    yield sensor
+
         # @staticmethod
         def exists(self, name):
-            """Checks if the sensor name exists"""
-            return bool(self.supported_sensors.match(name))
+            """Checks if the sensor name exists, ignoring its modifier"""
+            name = split_placeholder(name)[0]
+            if self.supported_sensors.match(name):
+                return True
+
+            return next(self._sensors(name, self._plugins.classes(name)), None) is not None
 
         # @staticmethod
         def check(self, sensor_string):
-            for sensor in self.sensor_instances:
+            sensor_string = split_placeholder(sensor_string)[0]
+            for sensor in self._sensors(sensor_string, self.sensor_classes):
                 sensor.check(sensor_string)
+            for sensor in self._sensors(sensor_string, self._plugins.classes(sensor_string)):
+                self._plugins.check(sensor, sensor_string)
 
         def add(self, name, desc, cmd):
             """Adds a custom sensors."""
@@ -145,6 +279,7 @@ class SensorManager(object):
 
             self.settings["sensors"][name] = (desc, cmd)
             self.update_regex()
+            self.update_plan()
 
         def delete(self, name):
             """Deletes a custom sensors."""
@@ -159,6 +294,7 @@ class SensorManager(object):
 
             del sensors[name]
             self.update_regex()
+            self.update_plan()
 
         def edit(self, name, newname, desc, cmd):
             """Edits a custom sensors."""
@@ -180,6 +316,7 @@ class SensorManager(object):
             self.settings["custom_text"] = self.settings["custom_text"].replace(
                 name, newname)
             self.update_regex()
+            self.update_plan()
 
         def load_settings(self):
             """It gets the settings from the config file and
@@ -194,6 +331,23 @@ class SensorManager(object):
                     self.settings['interval'] = cfg['interval']
                 if cfg['on_startup'] is not None:
                     self.settings['on_startup'] = cfg['on_startup']
+                for key in ('refresh', 'adaptive', 'history_size', 'graph', 'stats_log_interval',
+                            'script_timeout', 'script_concurrency',
+                            'script_timeouts', 'rate_smoothing', 'public_info_url',
+                            'probe_targets', 'plugin_budget', 'export_socket',
+                            'export_page', 'applets'):
+                    if cfg.get(key) is not None:
+                        self.settings[key] = cfg[key]
+
+                self._adaptive.clear()
+                self._history.clear()
+                self._executor.timeout = self.settings['script_timeout']
+                self._plugins.budget = self.settings['plugin_budget']
+                self.set_export(self.settings['export_socket'])
+                self.set_export_page(self.settings['export_page'])
+                self._executor.set_max_workers(self.settings['script_concurrency'])
+                public_info().set_url(self.settings['public_info_url'])
+                connectivity_probe().set_targets(self.settings['probe_targets'])
                 if cfg['sensors'] is not None:
                     # need to merge our current list of sensors with what was previously saved
                     newcopy = self.settings['sensors']
@@ -205,6 +359,10 @@ class SensorManager(object):
                     self.settings['sensors'].pop("nvgputemp", None)
                 if "cputemp" in self.settings['sensors']:
                     self.settings['sensors'].pop("cputemp", None)
+                if "cputemp[FC]?" in self.settings['sensors']:
+                    self.settings['sensors'].pop("cputemp[FC]?", None)
+                if r"cpu\d*" in self.settings['sensors']:
+                    self.settings['sensors'].pop(r"cpu\d*", None)
 
                 self.update_regex()
 
@@ -212,6 +370,13 @@ class SensorManager(object):
                 logging.exception(ex)
                 logging.error('Reading settings failed')
 
+            self.rescan()
+
+        def rescan(self):
+            """Rediscovers the hardware sensors and rebinds the label."""
+            temperature_index().scan()
+            self.update_plan()
+
         def save_settings(self):
             """It stores the current settings to the config file."""
             # TODO: use gsettings
@@ -223,12 +388,48 @@ class SensorManager(object):
                 logging.exception(ex)
                 logging.error('Writing settings failed')
 
+        def set_export(self, enabled):
+            """Starts or stops serving the sensors on the export socket."""
+            with self._sample_lock:
+                if enabled and self._export is None:
+                    from sysmonitor_common.export import MetricsServer
+
+                    server = MetricsServer()
+                    if server.start():
+                        self._export = server
+                elif not enabled and self._export is not None:
+                    self._export.stop()
+                    self._export = None
+
+        def set_export_page(self, enabled):
+            """Starts or stops writing the sensors to the shared page."""
+            with self._sample_lock:
+                if enabled and self._page is None:
+                    from sysmonitor_common.shm import SharedPage
+
+                    page = SharedPage()
+                    try:
+                        if page.start():
+                            self._page = page
+                    except OSError as ex:
+                        logging.error(_("Can not create the metrics page: {}").format(ex))
+                elif not enabled and self._page is not None:
+                    self._page.close()
+                    self._page = None
+
+        def get_raw_results(self):
+            """Returns the last raw value of every sensor sampled, before
+            rendering: numbers, tuples of numbers or strings."""
+            with self._sample_lock:
+                return dict(self._raw)
+
         def get_guide(self):
             """Updates the label guide from appindicator."""
 
             # foss - I'm doubtful any of this guide stuff works - this needs to be recoded
             # each sensor needs a sensor guide
-            data = self._fetcher.fetch()
+            # never sample from here - this runs on the main loop
+            data = dict(self._last_results)
 
             for key in data:
                 if key.startswith('fs'):
@@ -238,14 +439,16 @@ class SensorManager(object):
             data['mem'] = data['cpu'] = data['bat'] = '000%'
             data['net'] = '↓666kB/s ↑666kB/s'
 
-            self.settings['custom_text'].format(**data)
-            return self.settings['custom_text'].format(**data)
+            return self.get_label(data)
 
-        def get_label(self, data):
+        def get_label(self, data, subscriber=None):
             """It updates the appindicator text with the the values
-            from data"""
+            from data, in the label of subscriber if given"""
+            plan = self._label_plans.get(subscriber)
+            if plan is None:
+                plan = self.get_plan()
             try:
-                label = self.settings["custom_text"].format(**data) if len(data) \
+                label = plan.render(data) if len(data) \
                     else _("(no output)")
 
 
@@ -257,13 +460,61 @@ class SensorManager(object):
 
             return label
 
-        def initiate_fetcher(self, parent):
-            if self._fetcher is not None:
-                self._fetcher.stop()
-            self._fetcher = StatusFetcher(parent)
+        def initiate_fetcher(self, parent, main_loop=True):
+            """Delivers the sampled values to parent.update(). A single
+            fetcher serves every parent: the others keep theirs."""
+            fetcher = self._fetcher
+            if fetcher is not None and fetcher.alive.is_set() \
+                    and fetcher.main_loop == main_loop:
+                fetcher.add_parent(parent)
+                fetcher.wakeup()
+                return
+
+            if fetcher is not None:
+                fetcher.stop()
+            self._fetcher = StatusFetcher(parent, main_loop)
             self._fetcher.start()
             logging.info("Fetcher started")
 
+        def release_fetcher(self, parent):
+            """Stops delivering to parent; the fetcher stops with its last
+            parent. Returns whether it still runs for other parents."""
+            if self._fetcher is not None and not self._fetcher.remove_parent(parent):
+                self._fetcher.stop()
+                self._fetcher = None
+                logging.info("Fetcher stopped")
+
+            return self._fetcher is not None
+
+        def shutdown(self):
+            """Stops the fetcher, the exports, the streaming commands and
+            the custom commands still running: they have sessions of their
+            own and would outlive the front end."""
+            fetcher, self._fetcher = self._fetcher, None
+            if fetcher is not None:
+                fetcher.stop()
+                if fetcher is not current_thread():
+                    # let a pass in progress finish before stopping what
+                    # it may start
+                    fetcher.join(1)
+
+            self.set_export(False)
+            self.set_export_page(False)
+            with self._sample_lock:
+                self._streams.shutdown()
+                self._executor.shutdown()
+
+        def subscribe(self, subscriber):
+            """Adds the label of subscriber, e.g. a Budgie applet uuid, to
+            the sampled sensors: custom_text, or its own template if set
+            with set_custom_text(). Every label shares the same sampling."""
+            self._subscribers.add(subscriber)
+            self.update_plan()
+
+        def unsubscribe(self, subscriber):
+            self._subscribers.discard(subscriber)
+            self.update_plan()
+
         def fill_liststore(self, list_store):
             sensors = self.settings['sensors']
             for name in list(sensors.keys()):
@@ -274,11 +525,72 @@ class SensorManager(object):
 
             return cmd
 
-        def set_custom_text(self, custom_text):
-            self.settings["custom_text"] = custom_text
+        def set_custom_text(self, custom_text, subscriber=None):
+            if subscriber is None:
+                self.settings["custom_text"] = custom_text
+            else:
+                self.settings["applets"][subscriber] = custom_text
+            self.update_plan()
+
+        def _bind(self, name):
+            try:
+                instance = self.get(name)
+            except ISMError as ex:
+                logging.error("{%s}: %s", name, ex)
+                return None
+
+            if instance is not None:
+                if self._plugins.is_plugin(type(instance)):
+                    return self._plugins.bind(instance, name)
+                return instance.bind(name)
+
+            cmd = self.settings["sensors"].get(name, (None, True))[1]
+            if cmd is True:
+                logging.error(_("{{{}}} sensor not supported.").format(name))
+                return None
+
+            # custom sensor
+            return Binding(name, None, partial(self._custom_value, name), str)
+
+        def update_plan(self):
+            """Compiles custom_text into the plan of sensors sampled on
+            every pass. Needed whenever custom_text or the sensors change."""
+            # the labels of the subscribers are only rendered here; their
+            # sensors are sampled along with those of custom_text
+            extra = list(self.get_graph_settings()['sensors'])
+            label_plans = {}
+            for subscriber in self._subscribers:
+                template = self.settings["applets"].get(subscriber)
+                if template is not None and template != self.settings["custom_text"]:
+                    label_plans[subscriber] = LabelPlan(template, lambda name: None)
+                    extra.extend(label_plans[subscriber].names)
+
+            custom_text = self.settings["custom_text"]
+            if self._subscribers and len(label_plans) == len(self._subscribers):
+                # every subscriber has a label of its own
+                custom_text = ''
+
+            plan = LabelPlan(custom_text, self._bind, split_placeholder, extra)
+
+            commands = set(self.settings["sensors"][binding.name][1]
+                           for binding in plan.bindings if binding.sensor is None)
+            self._executor.forget(commands)
+            self._streams.sync(set(cmd[len(STREAM_PREFIX):].strip() for cmd in commands
+                                   if cmd.startswith(STREAM_PREFIX)))
+
+            self._plan = plan
+            self._label_plans = label_plans
+            if self._fetcher is not None:
+                self._fetcher.wakeup()
+
+        def get_plan(self):
+            if self._plan is None:
+                self.update_plan()
 
-        def get_custom_text(self):
-            return self.settings["custom_text"]
+            return self._plan
+
+        def get_custom_text(self, subscriber=None):
+            return self.settings["applets"].get(subscriber, self.settings["custom_text"])
 
         def set_interval(self, interval):
             self.settings["interval"] = interval
@@ -286,35 +598,303 @@ class SensorManager(object):
         def get_interval(self):
             return self.settings["interval"]
 
-        def get_results(self):
-            """Return a dict whose element are the sensors
-            and their values"""
+        def get_rate_smoothing(self):
+            return self.settings["rate_smoothing"]
+
+        def set_refresh(self, sensor, seconds):
+            """Overrides how often a sensor is sampled, None resets it."""
+            if seconds is None:
+                self.settings["refresh"].pop(sensor, None)
+            else:
+                self.settings["refresh"][sensor] = seconds
+
+            # the fetcher pops the deadlines while it samples
+            with self._sample_lock:
+                self._scheduler.reset()
+            if self._fetcher is not None:
+                self._fetcher.wakeup()
+
+        def get_refresh(self, sensor, instance=None):
+            """Returns the number of seconds between two samples of
+            a sensor: its current adaptive period if it has one, else the
+            configured value, else the sensor's own default, else the
+            global interval."""
+            rate = self._adaptive.get(sensor)
+            if rate is not None and rate.period is not None:
+                return rate.period
+
+            return self._base_refresh(sensor, instance)
+
+        def get_sampling_periods(self):
+            """Returns the current number of seconds between two samples
+            of every sensor of the label."""
+            return {name: self.get_refresh(name, binding.sensor)
+                    for name, binding in list(self._bindings.items())}
+
+        def _base_refresh(self, sensor, instance):
+            refresh = self.settings["refresh"].get(sensor)
+            if refresh is None and instance is not None:
+                refresh = instance.refresh
+
+            if refresh is None:
+                refresh = self.get_interval()
+
+            return refresh
+
+        def _adaptive_rate(self, sensor):
+            rate = self._adaptive.get(sensor)
+            if rate is None:
+                adaptive = self.settings["adaptive"]
+                cfg = adaptive.get(sensor, adaptive.get('*'))
+                if cfg is None:
+                    return None
+
+                rate = self._adaptive[sensor] = AdaptiveRate.from_settings(cfg)
+
+            return rate
+
+        def get_graph_settings(self):
+            settings = dict(GRAPH_DEFAULTS)
+            settings.update(self.settings["graph"])
+            return settings
+
+        def set_graph_settings(self, **settings):
+            self.settings["graph"].update(settings)
+            self.update_plan()
+
+        def get_graph_sample(self):
+            """Returns (count, values, scales) for the graph sensors: count
+            grows with every sample, values are their last raw values as
+            numbers (None if not numeric) and scales is 100 for the
+            percentages, None for values without a fixed scale."""
+            return self._graph_sample
+
+        def _update_graph(self, due):
+            names = self.get_graph_settings()['sensors']
+            if not names or not any(binding.name in names for binding in due):
+                return
+
+            values = []
+            scales = []
+            for name in names:
+                binding = self._bindings.get(name)
+                values.append(to_number(self._raw.get(name)))
+                scales.append(100 if binding is not None and binding.render is percent else None)
+
+            self._graph_sample = (self._graph_sample[0] + 1, values, scales)
+
+        def get_stats(self):
+            """Returns the SamplerStats of the sensors."""
+            return self._stats
+
+        def dump_stats(self):
+            """Returns the sampler statistics as a text table."""
+            with self._sample_lock:
+                return self._stats.dump(self.get_sampling_periods())
+
+        def get_script_stats(self):
+            """Returns the execution counters of the custom sensors,
+            keyed by sensor name."""
+            stats = self._executor.stats()
+            stream_stats = self._streams.stats()
             res = {}
-            import sys
-            sys.path.insert(0, '/usr/share/indicator-sysmonitor')
-            from sysmonitor_common.preferences import Preferences
+            for name, (_desc, cmd) in list(self.settings["sensors"].items()):
+                if isinstance(cmd, str) and cmd.startswith(STREAM_PREFIX):
+                    cmd = cmd[len(STREAM_PREFIX):].strip()
+                    if cmd in stream_stats:
+                        res[name] = stream_stats[cmd]
+                elif cmd in stats:
+                    res[name] = stats[cmd]
+
+            return res
+
+        def _on_script_done(self, command):
+            # a custom sensor got its first output: show it right away
+            with self._sample_lock:
+                for name in list(self._values):
+                    if self.settings["sensors"].get(name, (None, None))[1] == command:
+                        self._scheduler.make_due(name)
+
+            if self._fetcher is not None:
+                self._fetcher.wakeup()
 
-            # We call this only once per update
-            global cpu_load
-            cpu_load = ps.cpu_percent(interval=0, percpu=True)
+        def _wake_sensors(self, sensor_class):
+            # a background fetch got new data: show it right away
+            with self._sample_lock:
+                for name, binding in self._bindings.items():
+                    if isinstance(binding.sensor, sensor_class):
+                        self._scheduler.make_due(name)
 
-            # print (self.settings["custom_text"]) custom_text is the full visible string seen in Preferences edit field
-            for sensor in Preferences.sensors_regex.findall(
-                    self.settings["custom_text"]):
+            if self._fetcher is not None:
+                self._fetcher.wakeup()
 
-                sensor = sensor[1:-1]
-                instance = self.get(sensor)
+        def get_next_wait(self):
+            """Seconds until the next sensor is due. Changes of the plan
+            wake the fetcher up, so this can exceed the interval when
+            every sensor is sampled less often."""
+            deadline = self._scheduler.next_deadline()
+            if deadline is None:
+                return self.get_interval()
 
-                if instance:
-                    value = instance.get_value(sensor)
-                    if value:
-                        res[sensor] = value
+            return max(deadline - time.monotonic(), 0)
 
-                else:  # custom sensor
-                    res[sensor] = BaseSensor.script_exec(self.settings["sensors"][sensor][1])
+        def get_results(self):
+            """Return a dict whose element are the sensors
+            and their values"""
+            # a stopped fetcher may still be finishing its last pass while
+            # the new one starts; sensors keep state so never overlap them
+            with self._sample_lock:
+                res = self._sample()
 
+            self._last_results = res
             return res
 
+        def _custom_value(self, sensor, snapshot):
+            cmd = self.settings["sensors"][sensor][1]
+            if cmd.startswith(STREAM_PREFIX):
+                value = self._streams.get(cmd[len(STREAM_PREFIX):].strip())
+            else:
+                value = self._executor.get(
+                    cmd, self.settings["script_timeouts"].get(sensor))
+
+            return value or "..."
+
+        def _sample(self):
+            tick_start = time.perf_counter_ns()
+            plan = self.get_plan()
+            now = time.monotonic()
+            replanned = plan is not self._sampled_plan
+            if replanned:
+                self._sampled_plan = plan
+                self._bindings = {binding.name: binding for binding in plan.bindings}
+                self._scheduler.sync(self._bindings, now)
+                self._modifiers = {}
+                for _name, sensor, modifier in plan.derived:
+                    self._modifiers.setdefault(sensor, set()).add(modifier)
+                # a sensor sampled less often than the label changes
+                # needs its new modifiers before its next sample
+                for sensor, modifiers in self._modifiers.items():
+                    history = self._history.get(sensor)
+                    if history is not None:
+                        for modifier in modifiers:
+                            history.add_modifier(modifier)
+                names = set(self._bindings).union(name for name, _sensor, _mod in plan.derived)
+                for sensor in list(self._values):
+                    if sensor not in names:
+                        del self._values[sensor]
+                for sensor in list(self._adaptive):
+                    if sensor not in self._bindings:
+                        del self._adaptive[sensor]
+                self._stats.forget(self._bindings)
+                for sensor in list(self._history):
+                    if sensor not in self._modifiers:
+                        del self._history[sensor]
+                for sensor in list(self._raw):
+                    if sensor not in self._bindings:
+                        del self._raw[sensor]
+                self._failing.intersection_update(self._bindings)
+
+            due = [self._bindings[sensor] for sensor in self._scheduler.due(now)]
+
+            # every source is read only once per update, whatever the
+            # number of sensors using it
+            snapshot = Snapshot(now)
+            snapshot.read(set(source for binding in due if binding.sensor is not None
+                              for source in binding.sensor.sources))
+
+            for binding in due:
+                stats = self._stats.sensor(binding.name)
+                forks_before = forks()
+                start = time.perf_counter_ns()
+                error = False
+                try:
+                    raw = binding.fetch(snapshot)
+                except Exception as ex:
+                    # a broken sensor fails on every pass: only the first
+                    # failure gets a traceback
+                    if binding.name in self._failing:
+                        logging.debug("%s failed again: %s", binding.name, ex)
+                    else:
+                        self._failing.add(binding.name)
+                        logging.exception(ex)
+                    raw = None
+                    error = True
+                else:
+                    if binding.name in self._failing:
+                        self._failing.discard(binding.name)
+                        logging.info("%s works again", binding.name)
+
+                stats.record(time.perf_counter_ns() - start, error, forks() - forks_before)
+                if binding.sensor is None:
+                    # custom commands run on the executor's threads
+                    stats.forks = self._executor.runs(self.settings["sensors"][binding.name][1])
+
+                period = self._base_refresh(binding.name, binding.sensor)
+                rate = self._adaptive_rate(binding.name)
+                if rate is not None:
+                    period = rate.update(raw, period)
+                self._scheduler.reschedule(binding.name, period, now)
+
+                if raw is not None:
+                    self._values[binding.name] = binding.render(raw)
+                    self._raw[binding.name] = raw
+                else:
+                    self._values.pop(binding.name, None)
+                    self._raw.pop(binding.name, None)
+
+                if binding.name in self._modifiers:
+                    self._record(binding, raw, now)
+
+            if due or replanned:
+                for name, sensor, modifier in self._sampled_plan.derived:
+                    history = self._history.get(sensor)
+                    if history is not None:
+                        values = history.get(modifier)
+                        if values is None:
+                            self._values[name] = "..."
+                        else:
+                            self._values[name] = self._bindings[sensor].render(
+                                values[0] if history.scalar else values)
+                    elif sensor in self._values:
+                        # not a number: shown as it is
+                        self._values[name] = self._values[sensor]
+
+            self._update_graph(due)
+
+            if due:
+                deadline = self._scheduler.next_deadline()
+                self._stats.tick(time.perf_counter_ns() - tick_start,
+                                 deadline is not None and deadline <= time.monotonic())
+                log_interval = self.settings["stats_log_interval"]
+                if log_interval and now - self._stats_logged >= log_interval:
+                    self._stats_logged = now
+                    logging.debug("sampler: %s", self._stats.summary())
+
+                if self._export is not None:
+                    self._export.publish(dict(self._values), dict(self._raw),
+                                         self.get_label(self._values))
+                if self._page is not None:
+                    self._page.write(self._raw)
+
+            return dict(self._values)
+
+        def _record(self, binding, raw, now):
+            # keeps the history of the sensors used with a modifier
+            values = to_components(raw)
+            if values is None:
+                return
+
+            history = self._history.get(binding.name)
+            if history is None or history.width != len(values):
+                history = SensorHistory(self.settings["history_size"], len(values),
+                                        not isinstance(raw, tuple))
+                self._history[binding.name] = history
+
+            for modifier in self._modifiers[binding.name]:
+                history.add_modifier(modifier)
+
+            history.push(now, values)
+
     def __init__(self):
 
         if SensorManager._instance is None:
@@ -332,10 +912,32 @@ class SensorManager(object):
         return setattr(self.__instance, attr, value)
 
 
+def percent(value):
+    """Renders a raw percentage, values which are not numbers (N/A...)
+    are shown as they are."""
+    if isinstance(value, (int, float)):
+        return "{:02.0f}%".format(value)
+
+    return str(value)
+
+
+def per_second(value):
+    if isinstance(value, (int, float)):
+        return "{:.0f}/s".format(value)
+
+    return str(value)
+
+
+def celsius_to_fahrenheit(value):
+    return (value * 1.8) + 32
+
+
 class BaseSensor(object):
     name = ''
     desc = ''
     cmd = True
+    refresh = None  # seconds between two samples, None means the interval
+    sources = ()  # data sources read once per update, see sources.READERS
 
     def check(self, sensor):
         '''
@@ -348,18 +950,27 @@ class BaseSensor(object):
         if sensor == self.name:
             return True
 
+    def bind(self, sensor):
+        '''
+        binds a sensor string to this sensor; the parameters of the
+        sensor string are parsed here, once, not on every sample
+        :param sensor: string representation of the sensor
+        :return: a Binding whose fetch(snapshot) returns the raw value and
+          render(raw) the text shown in the label
+        '''
+        return Binding(sensor, self, lambda snapshot: self.get_value(sensor), str)
+
     def get_value(self, sensor_data):
         return None
 
     @staticmethod
-    def script_exec(command):
+    def script_exec(command, timeout=10):
         """Execute a custom command."""
         try:
-            output = subprocess.Popen(command, stdout=subprocess.PIPE,
-                                      shell=True).communicate()[0].strip()
+            output = run_command(command, timeout)
         except:
-            output = _("Error")
             logging.error(_("Error running: {}").format(command))
+            return _("Error")
 
         return output.decode('utf-8') if output else _("(no output)")
 
@@ -368,13 +979,12 @@ class NvGPUSensor(BaseSensor):
     name = 'nvgpu'
     desc = _('Nvidia GPU utilization')
 
-    def get_value(self, sensor):
-        if sensor == 'nvgpu':
-            return "{:02.0f}%".format(self._fetch_gpu())
+    def bind(self, sensor):
+        return Binding(sensor, self, self._fetch_gpu, percent)
 
-    def _fetch_gpu(self):
+    def _fetch_gpu(self, snapshot):
         try:
-            result = subprocess.check_output(['nvidia-smi', '--query-gpu=utilization.gpu', '--format=csv'])
+            result = check_output(['nvidia-smi', '--query-gpu=utilization.gpu', '--format=csv'])
             perc = result.splitlines()[-1]
             perc = perc[:-2]
         except:
@@ -385,27 +995,19 @@ class NvGPUSensor(BaseSensor):
 class AmdGpuSensor(BaseSensor):
     name = 'amdgpu'
     desc = _('If CPU isnot AMD, this your eGPU')
+    card = 'card0'
 
-    def get_value(self, sensor):
-        if sensor == 'amdgpu':
-            return "{:02.0f}%".format(self._fetch_gpu())
+    def bind(self, sensor):
+        return Binding(sensor, self, self._fetch_gpu, percent)
 
-    def _fetch_gpu(self):
-        result = subprocess.check_output(['cat', '/sys/class/drm/card0/device/gpu_busy_percent'])
-        return int(result)
+    def _fetch_gpu(self, snapshot):
+        return int(read_file('/sys/class/drm/{}/device/gpu_busy_percent'.format(self.card)))
 
 
-class AmdGpu1Sensor(BaseSensor):
+class AmdGpu1Sensor(AmdGpuSensor):
     name = 'amdgpu1'
     desc = _('If CPU&GPU==AMD, this is the eGPU')
-
-    def get_value(self, sensor):
-        if sensor == 'amdgpu':
-            return "{:02.0f}%".format(self._fetch_gpu())
-
-    def _fetch_gpu(self):
-        result = subprocess.check_output(['cat', '/sys/class/drm/card1/device/gpu_busy_percent'])
-        return int(result)
+    card = 'card1'
 
 
 class NvGPUTemp(BaseSensor):
@@ -414,52 +1016,44 @@ class NvGPUTemp(BaseSensor):
     name = 'nvgputemp[FC]?'
     desc = _('Nvidia GPU Temperature, optionally in Fahrenheit (F) default Celsius (C)')
 
-    fahrenheit = False
-
     def check(self, sensor):
         if sensor[:9] != "nvgputemp":
             return False
 
-        if re.findall("[F]", sensor):
-            self.fahrenheit = True
-        else:
-            self.fahrenheit = False
-
         return True
 
-    def get_value(self, sensor):
-        if sensor[:9] != "nvgputemp":
-            return None
+    def bind(self, sensor):
         # degrees symbol is unicode U+00B0
-
-        if self.fahrenheit:
-            return "{}\u00B0F".format(self._fetch_gputemp())
+        if "F" in sensor[9:]:
+            render = lambda value: "{:.0f}\u00B0F".format(celsius_to_fahrenheit(value))
         else:
-            return "{}\u00B0C".format(self._fetch_gputemp())
+            render = "{}\u00B0C".format
+
+        return Binding(sensor, self, self._fetch_gputemp, render)
 
-    def _fetch_gputemp(self):
+    def _fetch_gputemp(self, snapshot):
         try:
-            result = subprocess.check_output(['nvidia-smi', '--query-gpu=temperature.gpu', '--format=csv'])
+            result = check_output(['nvidia-smi', '--query-gpu=temperature.gpu', '--format=csv'])
             perc = result.splitlines()[1]
         except:
             perc = -1
 
-        if self.fahrenheit and perc >= 0:
-            calc = int(perc)
-            ret = (calc * 1.8) + 32
         return int(perc)
 
 class CPUSensor(BaseSensor):
-    name = r'cpu\d*'
-    desc = _('Average CPU usage')
+    name = r'cpu\d*(//max)?'
+    desc = _('Average CPU usage, of a core with cpuN, of the busiest core with cpu//max')
+    sources = ('procstat',)
     cpus = re.compile(r"\Acpu\d*\Z")
     last = None
-    if ps_v1_api:
-        cpu_count = ps.NUM_CPUS
-    else:
-        cpu_count = ps.cpu_count()
+
+    def __init__(self):
+        self.cpu_count = ps.NUM_CPUS if ps_v1_api else ps.cpu_count()
 
     def check(self, sensor):
+        if sensor == 'cpu//max':
+            return True
+
         if self.cpus.match(sensor):
             if len(sensor) == 3:
                 nber = 0
@@ -471,174 +1065,175 @@ class CPUSensor(BaseSensor):
 
             return True
 
-    def get_value(self, sensor):
+    def bind(self, sensor):
         if sensor == 'cpu':
-            return "{:02.0f}%".format(self._fetch_cpu())
-        elif CPUSensor.cpus.match(sensor):
-            cpus = self._fetch_cpu(percpu=True)
-            return "{:02.0f}%".format(cpus[int(sensor[3:])])
+            return Binding(sensor, self, self._fetch_cpu, percent)
+        if sensor == 'cpu//max':
+            return Binding(sensor, self, self._fetch_busiest, percent)
 
-        return None
+        return Binding(sensor, self, partial(self._fetch_core, int(sensor[3:])), percent)
+
+    def _fetch_core(self, index, snapshot):
+        # None on the first read of /proc/stat, which only primes the
+        # counters
+        value = snapshot['procstat'].busy(index)
+        return "..." if value is None else value
 
-    def _fetch_cpu(self, percpu=False):
-        if percpu:
-            return cpu_load
+    def _fetch_cpu(self, snapshot):
+        value = snapshot['procstat'].busy()
+        return "..." if value is None else value
 
-        r = 0.0
-        for i in cpu_load:
-            r += i
+    def _fetch_busiest(self, snapshot):
+        value = snapshot['procstat'].busiest()
+        return "..." if value is None else value
 
-        r /= self.cpu_count
 
-        return r
+class CPUTimesSensor(CPUSensor):
+    """Share of the CPU time spent in one state of /proc/stat, e.g.
+    cpu_steal for every CPU, cpu2_iowait for the third core"""
+
+    name = r'cpu\d*_({})'.format('|'.join(CPU_FIELDS))
+    desc = _('CPU time in user, nice, system, idle, iowait, irq, softirq or steal: cpu_steal, cpu2_iowait')
+    cpus = re.compile(r"\Acpu(\d*)_({})\Z".format('|'.join(CPU_FIELDS)))
+
+    def check(self, sensor):
+        match = self.cpus.match(sensor)
+        if match:
+            if match.group(1) and int(match.group(1)) >= self.cpu_count:
+                raise ISMError(_("Invalid number of CPUs."))
+
+            return True
+
+    def bind(self, sensor):
+        match = self.cpus.match(sensor)
+        core = int(match.group(1)) if match.group(1) else None
+        return Binding(sensor, self, partial(self._fetch_time, CPU_FIELDS.index(match.group(2)), core),
+                       percent)
+
+    @staticmethod
+    def _fetch_time(index, core, snapshot):
+        value = snapshot['procstat'].get(index, core)
+        return "..." if value is None else value
+
+
+class ProcStatSensor(BaseSensor):
+    name = 'ctxt|intr|forks|procs_running|procs_blocked'
+    desc = _('Context switches, interrupts and forks per second, running or blocked processes')
+    sources = ('procstat',)
+
+    def check(self, sensor):
+        return sensor in ('ctxt', 'intr', 'forks', 'procs_running', 'procs_blocked')
+
+    def bind(self, sensor):
+        if sensor.startswith('procs_'):
+            return Binding(sensor, self, partial(self._fetch_procs, sensor), str)
+
+        return Binding(sensor, self, partial(self._fetch_rate, sensor), per_second)
+
+    @staticmethod
+    def _fetch_rate(name, snapshot):
+        return snapshot['procstat'].rates.get(name, "...")
+
+    @staticmethod
+    def _fetch_procs(name, snapshot):
+        return getattr(snapshot['procstat'], name)
 
 
 class MemSensor(BaseSensor):
     name = 'mem'
     desc = _('Physical memory in use.')
+    sources = ('meminfo',)
 
-    def get_value(self, sensor_data):
-        return '{:02.0f}%'.format(self._fetch_mem())
+    def bind(self, sensor):
+        return Binding(sensor, self, self._fetch_mem, percent)
 
-    def _fetch_mem(self):
+    def _fetch_mem(self, snapshot):
         """It gets the total memory info and return the used in percent."""
+        meminfo = snapshot['meminfo']
 
-        def grep(pattern, word_list):
-            expr = re.compile(pattern)
-            arr = [elem for elem in word_list if expr.match(elem)]
-            return arr[0]
-
-        with open('/proc/meminfo') as meminfofile:
-            meminfo = meminfofile.readlines()
-
-        total = SensorManager.digit_regex.findall(grep("MemTotal", meminfo))[0]
-        release = re.split(r'\.', platform.release())
-        major_version = int(release[0])
-        minor_version = int(re.search(r'\d+', release[1]).group())
-        if (minor_version >= 16 and major_version == 3) or (major_version > 3):
-            available = SensorManager.digit_regex.findall(
-                grep("MemAvailable", meminfo))[0]
-            return 100 - 100 * int(available) / float(total)
+        total = meminfo['MemTotal']
+        # MemAvailable exists since linux 3.14
+        if 'MemAvailable' in meminfo:
+            available = meminfo['MemAvailable']
         else:
-            free = SensorManager.digit_regex.findall(
-                grep("MemFree", meminfo))[0]
-            cached = SensorManager.digit_regex.findall(
-                grep("Cached", meminfo))[0]
-            free = int(free) + int(cached)
-            return 100 - 100 * free / float(total)
+            available = meminfo['MemFree'] + meminfo['Cached']
+
+        return 100 - 100 * available / float(total)
+
+
+def net_counters(netdev, ifaces=None):
+    """Returns the byte counters of the interfaces as a dict keyed
+    by (interface, 'rx' or 'tx'), for a CounterRate."""
+    counters = {}
+    for iface, iostat in netdev.items():
+        if ifaces is None or iface in ifaces:
+            counters[(iface, 'rx')] = iostat.bytes_recv
+            counters[(iface, 'tx')] = iostat.bytes_sent
+
+    return counters
+
+
+def sum_rates(rates):
+    """Returns the total (down, up) rate of CounterRate results
+    keyed by (interface, 'rx' or 'tx')."""
+    down = up = 0.0
+    for (_iface, way), rate in rates.items():
+        if way == 'rx':
+            down += rate
+        else:
+            up += rate
+
+    return down, up
 
 
 class NetSensor(BaseSensor):
     name = 'net'
     desc = _('Network activity.')
-    _last_net_usage = [0, 0]  # (up, down)
+    sources = ('netdev',)
 
-    def get_value(self, sensor_data):
-        return self._fetch_net()
-
-    def _fetch_net(self):
-        """It returns the bytes sent and received in bytes/second"""
-        current = [0, 0]
-        for _, iostat in list(ps.net_io_counters(pernic=True).items()):
-            current[0] += iostat.bytes_recv
-            current[1] += iostat.bytes_sent
-        dummy = copy.deepcopy(current)
-
-        current[0] -= self._last_net_usage[0]
-        current[1] -= self._last_net_usage[1]
-        self._last_net_usage = dummy
-        mgr = SensorManager()
-        current[0] /= mgr.get_interval()
-        current[1] /= mgr.get_interval()
+    def __init__(self):
+        self._rates = CounterRate()
+
+    def bind(self, sensor):
+        self._rates.smoothing = SensorManager().get_rate_smoothing()
+        return Binding(sensor, self, self._fetch_net, self._render)
+
+    @staticmethod
+    def _render(current):
         return '↓ {:>9s}/s ↑ {:>9s}/s'.format(bytes_to_human(current[0]), bytes_to_human(current[1]))
 
-class NetCompSensor(BaseSensor):
+    def _fetch_net(self, snapshot):
+        """It returns the bytes received and sent in bytes/second"""
+        return sum_rates(self._rates.update(net_counters(snapshot['netdev']),
+                                            snapshot.timestamp))
+
+class NetCompSensor(NetSensor):
     name = 'netcomp'
     desc = _('Network activity in Compact form.')
-    _last_net_usage = [0, 0]  # (up, down)
 
-    def get_value(self, sensor_data):
-        return self._fetch_net()
-
-    def _fetch_net(self):
-        """It returns the bytes sent and received in bytes/second"""
-        current = [0, 0]
-        for _, iostat in list(ps.net_io_counters(pernic=True).items()):
-            current[0] += iostat.bytes_recv
-            current[1] += iostat.bytes_sent
-        dummy = copy.deepcopy(current)
-
-        current[0] -= self._last_net_usage[0]
-        current[1] -= self._last_net_usage[1]
-        self._last_net_usage = dummy
-        mgr = SensorManager()
-        current[0] /= mgr.get_interval()
-        current[1] /= mgr.get_interval()
+    @staticmethod
+    def _render(current):
         return '⇵ {:>9s}/s'.format(bytes_to_human(current[0] + current[1]))
 
 class TotalNetSensor(BaseSensor):
     name = 'totalnet'
     desc = _('Total Network activity.')
+    sources = ('netdev',)
 
-    def get_value(self, sensor_data):
-        return self._fetch_net()
+    def bind(self, sensor):
+        return Binding(sensor, self, self._fetch_net,
+                       lambda total: ' Σ {:>9s}'.format(bytes_to_human(total)))
 
-    def _fetch_net(self):
+    def _fetch_net(self, snapshot):
         """It returns total number the bytes sent and received"""
-        current = [0, 0]
-        for _, iostat in list(ps.net_io_counters(pernic=True).items()):
-            current[0] += iostat.bytes_recv
-            current[1] += iostat.bytes_sent
-
-        mgr = SensorManager()
-        current[0] /= mgr.get_interval()
-        current[1] /= mgr.get_interval()
-        return ' Σ {:>9s}'.format(bytes_to_human(current[0] + current[1]))
+        return sum(net_counters(snapshot['netdev']).values())
 
-class SimpleNetSensor(BaseSensor):
+class SimpleNetSensor(NetSensor):
     name = 'simpleNet'
     desc = _('Simple Network activity.')
-    _last_net_usage = [0, 0]  # (up, down)
-
-    def get_value(self, sensor_data):
-        return self._fetch_net()
-
-    def _fetch_net(self):
-        rx = 0
-        tx = 0
-
-        iface = get_default_iface()
-
-        if not iface:
-            iface = "enp3s0"
-
-        net = ps.net_io_counters(pernic=True)
-
-        if iface in net:
-            iostat = net[iface]
-            rx = iostat.bytes_recv
-            tx = iostat.bytes_sent
-
-        current = [rx, tx]
-
-        if self._last_net_usage == [0, 0]:
-            self._last_net_usage = copy.deepcopy(current)
-            return "↓0K ↑0K"
-
-        speed_rx = current[0] - self._last_net_usage[0]
-        speed_tx = current[1] - self._last_net_usage[1]
-
-        self._last_net_usage = copy.deepcopy(current)
-
-        mgr = SensorManager()
-        interval = mgr.get_interval()
-
-        if interval <= 0:
-            interval = 1
-
-        speed_rx /= interval
-        speed_tx /= interval
 
+    @staticmethod
+    def _render(speed):
         def bytes_to_human(n):
             if n < 1000:
                 return "{}B".format(int(n))
@@ -650,10 +1245,18 @@ class SimpleNetSensor(BaseSensor):
                 return "{}G".format(int(n / 1000 / 1000 / 1000))
 
         return "↓{:>2s} ↑{:>2s}".format(
-            bytes_to_human(speed_rx),
-            bytes_to_human(speed_tx)
+            bytes_to_human(speed[0]),
+            bytes_to_human(speed[1])
         )
 
+    def _fetch_net(self, snapshot):
+        """It returns the bytes received and sent in bytes/second
+        through the interface of the default route"""
+        iface = get_default_iface()
+
+        return sum_rates(self._rates.update(net_counters(snapshot['netdev'], (iface,)),
+                                            snapshot.timestamp))
+
 class BatSensor(BaseSensor):
     name = r'bat\d*'
     desc = _('Battery capacity.')
@@ -662,36 +1265,28 @@ class BatSensor(BaseSensor):
     def check(self, sensor):
         if self.bat.match(sensor):
             bat_id = int(sensor[3:]) if len(sensor) > 3 else 0
-            if not os.path.exists("/sys/class/power_supply/BAT{}".format(bat_id)):
+            if not os.path.exists(host_path("/sys/class/power_supply/BAT{}".format(bat_id))):
                 raise ISMError(_("Invalid number returned for the Battery sensor."))
 
             return True
 
-    def get_value(self, sensor):
-        if BatSensor.bat.match(sensor):
-            bat_id = int(sensor[3:]) if len(sensor) > 3 else 0
-            return '{:02.0f}%'.format(self._fetch_bat(bat_id))
-
-        return None
+    def bind(self, sensor):
+        bat_id = int(sensor[3:]) if len(sensor) > 3 else 0
+        return Binding(sensor, self, partial(self._fetch_bat, bat_id), percent)
 
-    def _fetch_bat(self, batid):
+    def _fetch_bat(self, batid, snapshot):
         """Fetch the the amount of remaining battery"""
-        capacity = 0
         try:
-            with open("/sys/class/power_supply/BAT{}/capacity".format(batid)) as state:
-                while True:
-                    capacity = int(state.readline())
-                    break
+            return int(read_file("/sys/class/power_supply/BAT{}/capacity".format(batid)))
 
         except IOError:
             return "N/A"
 
-        return capacity
-
 
 class FSSensor(BaseSensor):
     name = 'fs//.+'
     desc = _('Available space in file system.')
+    refresh = 60
 
     def check(self, sensor):
         if sensor.startswith("fs//"):
@@ -701,212 +1296,260 @@ class FSSensor(BaseSensor):
 
             return True
 
-    def get_value(self, sensor):
-        if sensor.startswith('fs//'):
-            parts = sensor.split('//')
-            return self._fetch_fs(parts[1])
+    def bind(self, sensor):
+        parts = sensor.split('//')
+        return Binding(sensor, self, partial(self._fetch_fs, parts[1]), self._render)
 
-        return None
+    @staticmethod
+    def _render(bytes_):
+        """It returns the amount of bytes in a human-readble format."""
+        for unit in B_UNITS:
+            if bytes_ < 1024:
+                return "{} {}".format(round(bytes_, 2), unit)
+            bytes_ /= 1024
 
-    def _fetch_fs(self, mount_point):
-        """It returns the amount of bytes available in the fs in
-        a human-readble format."""
+    def _fetch_fs(self, mount_point, snapshot):
+        """It returns the amount of bytes available in the fs."""
         if not os.access(mount_point, os.F_OK):
             return None
 
         stat = os.statvfs(mount_point)
-        bytes_ = stat.f_bavail * stat.f_frsize
-
-        for unit in B_UNITS:
-            if bytes_ < 1024:
-                return "{} {}".format(round(bytes_, 2), unit)
-            bytes_ /= 1024
+        return stat.f_bavail * stat.f_frsize
 
 
 class SwapSensor(BaseSensor):
     name = 'swap'
     desc = _("Average swap usage")
+    sources = ('swaps',)
 
-    def get_value(self, sensor):
-        return '{:02.0f}%'.format(self._fetch_swap())
+    def bind(self, sensor):
+        return Binding(sensor, self, self._fetch_swap, percent)
 
-    def _fetch_swap(self):
+    def _fetch_swap(self, snapshot):
         """Return the swap usage in percent"""
-        usage = 0
-        total = 0
         try:
-            with open("/proc/swaps") as swaps:
-                swaps.readline()
-                for line in swaps.readlines():
-                    dummy, dummy, total_, usage_, dummy = line.split()
-                    total += int(total_)
-                    usage += int(usage_)
-
-                if total == 0:
-                    return 0
-                else:
-                    return usage * 100 / total
-
+            total, usage = snapshot['swaps']
         except IOError:
             return "N/A"
 
+        if total == 0:
+            return 0
+        else:
+            return usage * 100 / total
+
 
 class UporDownSensor(BaseSensor):
+    """upordown and latency show the last result of the shared
+    connectivity probe, which wakes the label up when it changes."""
     name = 'upordown'
     desc = _("Display if your internet connection is up or down")
 
-    command = 'if wget -qO /dev/null google.com > /dev/null; then echo "☺"; else echo "☹"; fi'
+    def bind(self, sensor):
+        return Binding(sensor, self, self._fetch_status, str)
 
-    current_val = ""
-    lasttime = 0  # we refresh this every 10 seconds
+    def _fetch_status(self, snapshot):
+        up, _latency = connectivity_probe().get()
+        if up is None:
+            return "..."
 
-    def get_value(self, sensor):
-        if self.current_val == "" or self.lasttime == 0 or (time.time() - self.lasttime) > 10:
-            self.current_val = self.script_exec(self.command)
-            self.lasttime = time.time()
+        return "☺" if up else "☹"
 
-        return self.current_val
+
+class LatencySensor(UporDownSensor):
+    name = 'latency'
+    desc = _("Display the time to reach the internet")
+
+    def bind(self, sensor):
+        return Binding(sensor, self, self._fetch_latency, self._render)
+
+    @staticmethod
+    def _render(latency):
+        if isinstance(latency, str):
+            return latency
+
+        return "{:.0f}ms".format(latency)
+
+    def _fetch_latency(self, snapshot):
+        up, latency = connectivity_probe().get()
+        if up is None:
+            return "..."
+
+        return latency * 1000 if up else "-"
 
 
 class PublicIPSensor(BaseSensor):
+    """The public* sensors all read the answer of one shared request,
+    refreshed in the background every 10 minutes, so sampling them is
+    only a cache lookup."""
     name = 'publicip'
     desc = _("Display your public IP address")
+    refresh = 30
 
-    command = 'curl ipv4.icanhazip.com'
-
-    current_ip = ""
-    lasttime = 0  # we refresh this every 10 minutes
+    key = 'ip'
 
-    def get_value(self, sensor):
-        if self.current_ip == "" or self.lasttime == 0 or (time.time() - self.lasttime) > 600:
-            self.current_ip = self.script_exec(self.command)
-            self.lasttime = time.time()
+    def bind(self, sensor):
+        return Binding(sensor, self, self._fetch_info, str)
 
-        return self.current_ip
+    def _fetch_info(self, snapshot):
+        value = public_info().get(self.key)
+        return "..." if value is None else value
 
 
-class PublicCountrySensor(BaseSensor):
+class PublicCountrySensor(PublicIPSensor):
     name = "publiccountry"
     desc = _("Display your public country")
 
-    command = 'curl ifconfig.co/country'
-
-    current_country = ""
-    lasttime = 0  # we refresh this every 10 minutes
+    key = 'country'
 
-    def get_value(self, sensor):
-        if self.current_country == "" or self.lasttime == 0 or (time.time() - self.lasttime) > 600:
-            self.current_country = self.script_exec(self.command)
-            self.lasttime = time.time()
 
-        return self.current_country
-
-
-class PublicCountryISOCodeSensor(BaseSensor):
+class PublicCountryISOCodeSensor(PublicIPSensor):
     name = "publiccountryiso"
     desc = _("Display your public country ISO code")
 
-    command = 'curl ifconfig.co/country-iso'
-
-    current_country_iso = ""
-    lasttime = 0  # we refresh this every 10 minutes
-
-    def get_value(self, sensor):
-        if self.current_country_iso == "" or self.lasttime == 0 or (time.time() - self.lasttime) > 600:
-            self.current_country_iso = self.script_exec(self.command)
-            self.lasttime = time.time()
-
-        return self.current_country_iso
+    key = 'country_iso'
 
 
 class CPUTemp(BaseSensor):
     """Return CPU temperature expressed in Celsius (default or Fahrenheit)
+
+    cputemp shows the cpu package, cputemp//spec any input of the
+    temperature index, see TemperatureIndex.find
     """
 
-    name = 'cputemp[FC]?'
+    name = 'cputemp[FC]?(//.+)?'
     desc = _('CPU temperature, optionally in Fahrenheit (F), default in Celsius (C)')
+    prefix = 'cputemp'
 
-    fahrenheit = False
+    def _parse(self, sensor):
+        """Returns (fahrenheit, spec) of a sensor string."""
+        unit, _sep, spec = sensor[len(self.prefix):].partition('//')
+        return "F" in unit, spec
 
     def check(self, sensor):
-        if sensor[:7] != "cputemp":
+        if sensor[:len(self.prefix)] != self.prefix:
             return False
 
-        if re.findall("[F]", sensor):
-            self.fahrenheit = True
-        else:
-            self.fahrenheit = False
+        _fahrenheit, spec = self._parse(sensor)
+        if spec and not temperature_index().find(spec):
+            raise ISMError(_("No temperature input matching: {}").format(spec))
 
         return True
 
-    def get_value(self, sensor):
-        if sensor[:7] != "cputemp":
-            return None
+    def bind(self, sensor):
+        fahrenheit, spec = self._parse(sensor)
         # degrees symbol is unicode U+00B0
-
-        if self.fahrenheit:
-            return "{:02.0f}\u00B0F".format(self._fetch_cputemp())
+        if fahrenheit:
+            render = lambda value: "{:02.0f}\u00B0F".format(celsius_to_fahrenheit(value))
         else:
-            return "{:02.0f}\u00B0C".format(self._fetch_cputemp())
+            render = "{:02.0f}\u00B0C".format
 
-    def _fetch_cputemp(self):
+        files = [get_file(temp.path) for temp in temperature_index().find(spec)]
+        return Binding(sensor, self, partial(self._fetch_temp, files), render)
+
+    def _fetch_temp(self, files, snapshot):
         # http://www.mjmwired.net/kernel/Documentation/hwmon/sysfs-interface
+        ret = None
+        for temp_file in files:
+            try:
+                value = temp_file.read_int() / 1000
+            except (OSError, ValueError):
+                continue
 
-        # first try the following sys file
-        # /sys/class/thermal/thermal_zone0/temp
+            if ret is None or value > ret:
+                ret = value
 
-        # if that fails try various hwmon files
+        return ret
 
-        cat = lambda file: open(file, 'r').read().strip()
-        ret = None
 
-        zone = "/sys/class/thermal/thermal_zone0/"
-        try:
-            ret = int(cat(os.path.join(zone, 'temp'))) / 1000
-        except:
-            pass
+class TempSensor(CPUTemp):
+    """Return the temperature of any hwmon or thermal zone input
+    """
 
-        if ret:
-            if self.fahrenheit:
-                ret = (ret * 1.8) + 32
-            return ret
+    name = 'temp[FC]?//.+'
+    desc = _('Temperature of an input: temp//chip/label, temp//label or temp//max')
+    prefix = 'temp'
 
-        base = '/sys/class/hwmon/'
-        ls = sorted(os.listdir(base))
-        assert ls, "%r is empty" % base
-        for hwmon in ls:
-            hwmon = os.path.join(base, hwmon)
+    def check(self, sensor):
+        if not sensor.startswith(self.prefix) or '//' not in sensor:
+            return False
 
-            try:
-                ret = int(cat(os.path.join(hwmon, 'temp1_input'))) / 1000
-                if self.fahrenheit:
-                    ret = (ret * 1.8) + 32
-                break
-            except:
-                pass
+        return CPUTemp.check(self, sensor)
 
-        return ret
+
+class IsmStatsSensor(BaseSensor):
+    """The sampler watching itself: tick duration, overruns and the
+    slowest sensor."""
+    name = 'ism_stats'
+    desc = _('Sampling time of the indicator and its slowest sensor')
+
+    def bind(self, sensor):
+        return Binding(sensor, self, self._fetch_stats, str)
+
+    def _fetch_stats(self, snapshot):
+        return SensorManager().get_stats().summary()
 
 
 class StatusFetcher(Thread):
-    """It recollects the info about the sensors."""
+    """It recollects the info about the sensors.
 
-    def __init__(self, parent):
-        Thread.__init__(self)
-        self._parent = parent
+    Sampling runs on this worker thread so that slow sensors (nvidia-smi,
+    curl, custom scripts...) never block the GTK main loop; every finished
+    snapshot is handed back to the parents through GLib.idle_add, or
+    straight from this thread without main_loop."""
+
+    def __init__(self, parent, main_loop=True):
+        Thread.__init__(self, name='StatusFetcher', daemon=True)
+        self._parents = [parent]
+        self.main_loop = main_loop
         self.mgr = SensorManager()
         self.alive = Event()
         self.alive.set()
-        GLib.timeout_add_seconds(self.mgr.get_interval(), self.run)
+        self._wakeup = Event()
 
     def fetch(self):
         return self.mgr.get_results()
 
     def stop(self):
         self.alive.clear()
+        self._wakeup.set()
+
+    def wakeup(self):
+        """Runs the next pass now rather than at the next deadline."""
+        self._wakeup.set()
+
+    def add_parent(self, parent):
+        if parent not in self._parents:
+            self._parents = self._parents + [parent]
+
+    def remove_parent(self, parent):
+        """Returns whether parents remain."""
+        self._parents = [other for other in self._parents if other is not parent]
+        return bool(self._parents)
+
+    def _deliver(self, data):
+        # runs on the main loop, if any
+        if self.alive.is_set():
+            for parent in self._parents:
+                # parents may edit the values they get
+                parent.update(dict(data))
+
+        return False
 
     def run(self):
-        data = self.fetch()
-        self._parent.update(data)
-        if self.alive.isSet():
-            return True
+        if self.main_loop:
+            # imported here so that sampling works without gi, e.g. headless
+            from gi.repository import GLib
+            deliver = partial(GLib.idle_add, self._deliver)
+        else:
+            deliver = self._deliver
+
+        while self.alive.is_set():
+            try:
+                data = self.fetch()
+            except Exception as ex:
+                logging.exception(ex)
+            else:
+                deliver(data)
+
+            self._wakeup.wait(self.mgr.get_next_wait())
+            self._wakeup.clear()
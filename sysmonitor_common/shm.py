@@ -0,0 +1,256 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+import fcntl
+import logging
+import math
+import mmap
+import os
+import stat
+import struct
+import time
+from array import array
+
+from sysmonitor_common.history import to_components
+
+# The page, in native byte order:
+#   0  magic            8 bytes, MAGIC
+#   8  layout version   uint32, LAYOUT
+#  12  capacity         uint32, number of slots
+#  16  sequence         uint64, odd while the page is being written
+#  24  count            uint32, slots in use
+#  28  names version    uint32, changes with the name table
+#  32  time             double, time.time() of the sampling pass
+#  40  names            capacity * NAME_SIZE bytes, NUL padded UTF-8
+#  ..  values           capacity doubles, NaN for no value
+# A sensor with several components, like net, fills one slot per
+# component, named net.0, net.1...
+MAGIC = b'ISMPAGE\0'
+LAYOUT = 1
+CAPACITY = 64
+NAME_SIZE = 48
+
+_header = struct.Struct('=8sIIQIId')
+_sequence = struct.Struct('=Q')
+
+
+def page_path():
+    """The shared page, in the user's runtime directory, else in memory
+    when /dev/shm is there."""
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if directory and os.path.isdir(directory):
+        return os.path.join(directory, 'indicator-sysmonitor.metrics')
+
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else os.environ.get('TMPDIR', '/tmp')
+    return os.path.join(directory, 'indicator-sysmonitor-{}.metrics'.format(os.getuid()))
+
+
+def _check_owner(fd, path):
+    # /dev/shm and /tmp are shared: never write through a file planted
+    # there by another user, O_NOFOLLOW already ruling out symlinks
+    info = os.fstat(fd)
+    if not stat.S_ISREG(info.st_mode) or info.st_uid != os.getuid() or info.st_nlink != 1:
+        raise PermissionError("{} is not a metrics page of this user".format(path))
+
+
+def _size(capacity):
+    return _header.size + capacity * (NAME_SIZE + 8)
+
+
+class SharedPage(object):
+    """Writes the numeric values of every sampling pass to a memory mapped
+    file, for readers such as SharedPageReader to get them without a
+    syscall per query.
+
+    The page is protected by a seqlock: the sequence is odd while the
+    page is written, and a reader retries when it changed under it. The
+    name table is only rewritten when the sensors change. A seqlock only
+    has one writer: the file is locked as long as it is written."""
+
+    def __init__(self, path=None, capacity=CAPACITY):
+        self.path = path or page_path()
+        self.capacity = capacity
+        self._names = ()
+        self._names_version = 0
+        self._sequence = 0
+        self._values = array('d', [math.nan]) * capacity
+        self._values_offset = _header.size + capacity * NAME_SIZE
+        self._warned = False
+        self._fd = None
+        self._mm = None
+
+    def start(self):
+        """Maps the page; returns False if another process writes it."""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW | os.O_CLOEXEC, 0o600)
+        try:
+            _check_owner(fd, self.path)
+        except OSError:
+            os.close(fd)
+            raise
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            if os.fstat(fd).st_ino != os.stat(self.path).st_ino:
+                # unlinked by the previous writer meanwhile
+                raise BlockingIOError
+        except (BlockingIOError, FileNotFoundError):
+            os.close(fd)
+            logging.warning("%s is written by another process", self.path)
+            return False
+
+        try:
+            os.ftruncate(fd, _size(self.capacity))
+            self._mm = mmap.mmap(fd, _size(self.capacity))
+        except OSError:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+        magic, layout, old_capacity, sequence, _count, names_version, _time = \
+            _header.unpack_from(self._mm)
+        if (magic, layout, old_capacity) == (MAGIC, LAYOUT, self.capacity):
+            # left by a previous indicator, maybe still mapped by readers:
+            # carry on from its counters so that they notice the change
+            self._sequence = sequence + (sequence & 1)
+            self._names_version = names_version
+        else:
+            self._mm[:] = bytes(_size(self.capacity))
+            _header.pack_into(self._mm, 0, MAGIC, LAYOUT, self.capacity, 0, 0, 0, 0.0)
+
+        return True
+
+    def write(self, raw):
+        """Writes the raw values of the sensors, a dict by name."""
+        names = []
+        count = 0
+        values = self._values
+        for name, value in raw.items():
+            components = to_components(value)
+            if components is None:
+                components = (math.nan,)
+            if count + len(components) > self.capacity:
+                self._warn("The metrics page is full")
+                break
+
+            if len(name.encode('utf-8')) + 4 > NAME_SIZE:
+                self._warn("Sensor name too long for the metrics page: " + name)
+                continue
+
+            for index, component in enumerate(components):
+                names.append(name if len(components) == 1 else '{}.{}'.format(name, index))
+                values[count] = component
+                count += 1
+
+        names = tuple(names)
+        self._sequence += 1
+        _sequence.pack_into(self._mm, 16, self._sequence)
+
+        if names != self._names:
+            self._write_names(names)
+        self._mm[self._values_offset:self._values_offset + 8 * count] = values[:count].tobytes()
+        struct.pack_into('=IId', self._mm, 24, count, self._names_version, time.time())
+
+        self._sequence += 1
+        _sequence.pack_into(self._mm, 16, self._sequence)
+
+    def _write_names(self, names):
+        table = bytearray(self.capacity * NAME_SIZE)
+        for index, name in enumerate(names):
+            encoded = name.encode('utf-8')
+            table[index * NAME_SIZE:index * NAME_SIZE + len(encoded)] = encoded
+
+        self._mm[_header.size:self._values_offset] = bytes(table)
+        self._names = names
+        self._names_version += 1
+
+    def _warn(self, message):
+        # once: this runs on every pass
+        if not self._warned:
+            self._warned = True
+            logging.warning(message)
+
+    def close(self):
+        if self._mm is None:
+            return
+
+        self._mm.close()
+        self._mm = None
+        # unlinked while still locked, so that no other writer has it
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+        os.close(self._fd)
+        self._fd = None
+
+
+class SharedPageReader(object):
+    """Reads the page of a SharedPage, in this or another process. The
+    file is mapped once; read() then only copies memory.
+
+    A write takes microseconds: a page still being written after
+    timeout seconds was left so by a writer which died, and read()
+    raises TimeoutError rather than spinning forever."""
+
+    # tight retries before sleeping between them
+    SPINS = 100
+
+    def __init__(self, path=None):
+        path = path or page_path()
+        fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW | os.O_CLOEXEC)
+        try:
+            _check_owner(fd, path)
+            self._mm = mmap.mmap(fd, 0, prot=mmap.PROT_READ)
+        finally:
+            os.close(fd)
+
+        magic, layout, self.capacity = _header.unpack_from(self._mm)[:3]
+        if magic != MAGIC or layout != LAYOUT:
+            self._mm.close()
+            raise ValueError("not a metrics page")
+
+        self._values_offset = _header.size + self.capacity * NAME_SIZE
+        self._names_version = None
+        self._names = ()
+
+    def read(self, timeout=0.05):
+        """Returns (time, {name: value}) of the last sampling pass."""
+        mm = self._mm
+        spins = 0
+        deadline = None
+        while True:
+            sequence = _sequence.unpack_from(mm, 16)[0]
+            if sequence & 1:
+                spins += 1
+                if spins > self.SPINS:
+                    now = time.monotonic()
+                    if deadline is None:
+                        deadline = now + timeout
+                    elif now > deadline:
+                        raise TimeoutError("the metrics page writer did not finish")
+                    # the writer may be descheduled: give it the CPU
+                    time.sleep(0.0001)
+                continue
+
+            count, names_version, when = struct.unpack_from('=IId', mm, 24)
+            if names_version != self._names_version:
+                table = mm[_header.size:self._values_offset]
+                names = tuple(table[index * NAME_SIZE:(index + 1) * NAME_SIZE]
+                              .rstrip(b'\0').decode('utf-8')
+                              for index in range(self.capacity))
+            else:
+                names = self._names
+            values = array('d', mm[self._values_offset:self._values_offset + 8 * count])
+
+            if _sequence.unpack_from(mm, 16)[0] == sequence:
+                self._names_version = names_version
+                self._names = names
+                return when, dict(zip(names[:count], values))
+
+    def close(self):
+        self._mm.close()
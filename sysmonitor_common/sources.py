@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+import time
+
+import psutil as ps
+
+from sysmonitor_common.procstat import proc_stat
+from sysmonitor_common.pseudofiles import get_file
+
+
+def read_procstat():
+    """CPU time breakdown and scheduler counters since the previous read,
+    see procstat.ProcStat."""
+    return proc_stat().update()
+
+
+def read_meminfo():
+    """/proc/meminfo as a dict of values in kB."""
+    meminfo = {}
+    for line in get_file('/proc/meminfo').read_text().splitlines():
+        key, _sep, value = line.partition(':')
+        value = value.split()
+        if value:
+            meminfo[key] = int(value[0])
+
+    return meminfo
+
+
+def read_netdev():
+    """Per interface network counters."""
+    return ps.net_io_counters(pernic=True)
+
+
+def read_swaps():
+    """(total, used) swap space in kB."""
+    usage = 0
+    total = 0
+    for line in get_file("/proc/swaps").read_text().splitlines()[1:]:
+        dummy, dummy, total_, usage_, dummy = line.split()
+        total += int(total_)
+        usage += int(usage_)
+
+    return total, usage
+
+
+# 'name' => reader, sensors list the names they need in BaseSensor.sources
+READERS = {
+    'procstat': read_procstat,
+    'meminfo': read_meminfo,
+    'netdev': read_netdev,
+    'swaps': read_swaps,
+}
+
+
+class Snapshot(object):
+    """The data sources of one sampling pass.
+
+    Each source is read at most once per snapshot, so every sensor of a
+    label sees the same data and shares the cost of reading it. Sources
+    are normally prefetched through read(); one that was not is read on
+    first access. A failing source raises its error to every sensor
+    using it but does not affect the others."""
+
+    __slots__ = ('timestamp', '_data', '_errors')
+
+    def __init__(self, timestamp=None):
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+        self._data = {}
+        self._errors = {}
+
+    def read(self, sources):
+        for source in sources:
+            if source not in self._data and source not in self._errors:
+                try:
+                    self._data[source] = READERS[source]()
+                except Exception as ex:
+                    self._errors[source] = ex
+
+    def __getitem__(self, source):
+        try:
+            return self._data[source]
+        except KeyError:
+            pass
+
+        self.read((source,))
+        if source in self._errors:
+            raise self._errors[source]
+
+        return self._data[source]
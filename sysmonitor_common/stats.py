@@ -0,0 +1,192 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+import logging
+import os
+import threading
+
+_local = threading.local()
+
+
+def count_fork():
+    """Counts a process spawned by the calling thread."""
+    _local.forks = getattr(_local, 'forks', 0) + 1
+
+
+def forks():
+    """Returns the number of processes spawned by the calling thread."""
+    return getattr(_local, 'forks', 0)
+
+
+def process_usage():
+    """Returns the seconds elapsed since the process started, interpreter
+    start up included, and its resident memory in bytes. Read from the
+    real /proc, wherever pseudofiles.set_roots() points the sensors."""
+    with open('/proc/self/stat', 'rb') as f:
+        # the command name may hold spaces: split after it
+        fields = f.read().rpartition(b')')[2].split()
+    with open('/proc/uptime', 'rb') as f:
+        uptime = float(f.read().split()[0])
+
+    started = int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    return uptime - started, int(fields[21]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class SensorStats(object):
+    """Sampling counters of one sensor, durations in nanoseconds."""
+
+    __slots__ = ('count', 'errors', 'forks', 'last', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.forks = 0
+        self.last = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, duration, error=False, forks=0):
+        self.count += 1
+        self.last = duration
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        if error:
+            self.errors += 1
+        self.forks += forks
+
+    @property
+    def mean(self):
+        return self.total // self.count if self.count else 0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'forks': self.forks,
+            'last_ms': self.last / 1e6,
+            'mean_ms': self.mean / 1e6,
+            'max_ms': self.max / 1e6,
+        }
+
+
+class SamplerStats(object):
+    """Counters of every sensor and of the sampling passes (ticks).
+
+    Recording a sample only updates a few integers of a preallocated
+    object, cheap enough to be always on. A tick overruns when a sensor is
+    due again before it is even over: the sampler can not keep up.
+
+    The custom sensors only look their output up while sampling, their
+    commands run on other threads: scripts, if set, returns the counters
+    of these commands by sensor name, see ScriptExecutor.stats() and
+    StreamReader.stats()."""
+
+    def __init__(self):
+        self.sensors = {}  # name => SensorStats
+        self.ticks = SensorStats()
+        self.overruns = 0
+        self.startup = None  # seconds from the start of the process to the first label
+        self.scripts = None
+
+    def sensor(self, name):
+        stats = self.sensors.get(name)
+        if stats is None:
+            stats = self.sensors[name] = SensorStats()
+
+        return stats
+
+    def tick(self, duration, overrun):
+        self.ticks.record(duration)
+        if overrun:
+            self.overruns += 1
+
+    def first_label(self):
+        """To be called when a label is shown; the first call measures
+        the start up time."""
+        if self.startup is None:
+            self.startup, rss = process_usage()
+            logging.info("first label %.0fms after start, RSS %.1f MiB",
+                         self.startup * 1e3, rss / 2 ** 20)
+
+    def forget(self, keep):
+        for name in list(self.sensors):
+            if name not in keep:
+                del self.sensors[name]
+
+    def _scripts(self):
+        return self.scripts() if self.scripts is not None else {}
+
+    def slowest(self):
+        """Returns the name of the sensor with the highest mean duration,
+        None if nothing was sampled."""
+        if not self.sensors:
+            return None
+
+        return max(self.sensors, key=lambda name: self.sensors[name].mean)
+
+    def summary(self):
+        """One line: tick mean/max, overruns and the slowest sensor."""
+        text = "tick {:.1f}/{:.1f}ms, {} overruns, RSS {:.1f} MiB".format(
+            self.ticks.mean / 1e6, self.ticks.max / 1e6, self.overruns,
+            process_usage()[1] / 2 ** 20)
+        slowest = self.slowest()
+        if slowest is not None:
+            text += ", {} {:.1f}ms".format(slowest, self.sensors[slowest].mean / 1e6)
+        scripts = {name: stats for name, stats in self._scripts().items() if 'runs' in stats}
+        if scripts:
+            name = max(scripts, key=lambda name: scripts[name]['mean_ms'])
+            text += ", script {} {:.0f}ms".format(name, scripts[name]['mean_ms'])
+
+        return text
+
+    def dump(self, periods=None):
+        """A table of every counter; periods, if given, maps the sensors to
+        their current sampling period in seconds."""
+        lines = ["{:<24}{:>8}{:>8}{:>8}{:>10}{:>10}{:>10}{:>9}".format(
+            'sensor', 'count', 'errors', 'forks', 'last ms', 'mean ms', 'max ms', 'period')]
+        rows = sorted(self.sensors.items(), key=lambda item: -item[1].mean)
+        for name, stats in [('(tick)', self.ticks)] + rows:
+            period = periods.get(name) if periods else None
+            lines.append("{:<24}{:>8}{:>8}{:>8}{:>10.2f}{:>10.2f}{:>10.2f}{:>9}".format(
+                name, stats.count, stats.errors, stats.forks, stats.last / 1e6,
+                stats.mean / 1e6, stats.max / 1e6,
+                '' if period is None else '{:.3g}s'.format(period)))
+
+        scripts = self._scripts()
+        commands = sorted(((name, stats) for name, stats in scripts.items() if 'runs' in stats),
+                          key=lambda item: -item[1]['mean_ms'])
+        if commands:
+            lines.append("{:<24}{:>8}{:>10}{:>8}{:>10}{:>10}{:>10}".format(
+                'script', 'runs', 'timeouts', 'errors', 'last ms', 'mean ms', 'max ms'))
+            for name, stats in commands:
+                lines.append("{:<24}{:>8}{:>10}{:>8}{:>10.1f}{:>10.1f}{:>10.1f}".format(
+                    name, stats['runs'], stats['timeouts'], stats['errors'],
+                    stats['last_ms'], stats['mean_ms'], stats['max_ms']))
+        streams = sorted((name, stats) for name, stats in scripts.items() if 'lines' in stats)
+        if streams:
+            lines.append("{:<24}{:>8}{:>10}".format('stream', 'lines', 'restarts'))
+            for name, stats in streams:
+                lines.append("{:<24}{:>8}{:>10}".format(name, stats['lines'], stats['restarts']))
+
+        lines.append("{} overruns".format(self.overruns))
+        if self.startup is not None:
+            lines.append("first label {:.0f}ms after start".format(self.startup * 1e3))
+        lines.append("RSS {:.1f} MiB".format(process_usage()[1] / 2 ** 20))
+        return '\n'.join(lines)
+
+    def as_dict(self):
+        return {
+            'ticks': self.ticks.as_dict(),
+            'overruns': self.overruns,
+            'startup_ms': None if self.startup is None else self.startup * 1e3,
+            'rss_mib': process_usage()[1] / 2 ** 20,
+            'sensors': {name: stats.as_dict() for name, stats in self.sensors.items()},
+            'scripts': self._scripts(),
+        }
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# A simple indicator applet displaying cpu and memory information
+#
+# Fork Author: fossfreedom <foss.freedom@gmail.com>
+# Fork Homepage: https://github.com/fossfreedom/indicator-sysmonitor
+# License: GPL v3
+
+import re
+from collections import namedtuple
+
+SENSORS_REGEX = re.compile("{.+?}")
+
+# A placeholder bound to the sensor serving it: fetch(snapshot) samples the
+# raw value (None when there is nothing to show) from the data sources of
+# the current update and render(raw) formats it.
+Binding = namedtuple('Binding', ['name', 'sensor', 'fetch', 'render'])
+
+
+def parse_template(template):
+    """Splits a label template into its literal chunks and the names of
+    its placeholders: there is always one more literal than names."""
+    literals = []
+    names = []
+    pos = 0
+    for match in SENSORS_REGEX.finditer(template):
+        literals.append(template[pos:match.start()])
+        names.append(match.group()[1:-1])
+        pos = match.end()
+
+    literals.append(template[pos:])
+    return tuple(literals), tuple(names)
+
+
+class LabelPlan(object):
+    """A label template compiled once into its literal text and the
+    sensors bound to its placeholders.
+
+    bind(name) is called once per distinct placeholder and returns a
+    Binding, or None if the placeholder can not be served; such
+    placeholders are left out of the bindings and fail to render.
+
+    split(name), if given, returns (sensor, modifier) for placeholders
+    like {cpu:avg60} which are derived from another sensor's values:
+    the sensor is bound instead, once, and the placeholder is listed in
+    derived as (name, sensor, modifier).
+
+    extra names placeholders to bind and sample without showing them,
+    e.g. those of other labels sharing the same sampling."""
+
+    __slots__ = ('template', 'literals', 'names', 'bindings', 'derived')
+
+    def __init__(self, template, bind, split=None, extra=()):
+        self.template = template
+        self.literals, self.names = parse_template(template)
+
+        bindings = {}
+        derived = []
+        for name in dict.fromkeys(self.names + tuple(extra)):
+            base, modifier = split(name) if split is not None else (name, None)
+            if base not in bindings:
+                bindings[base] = bind(base)
+
+            if modifier is not None and bindings[base] is not None:
+                derived.append((name, base, modifier))
+
+        self.bindings = tuple(binding for binding in bindings.values() if binding is not None)
+        self.derived = tuple(derived)
+
+    def render(self, data):
+        """Assembles the label from the rendered values in data; raises
+        KeyError for a placeholder missing from data."""
+        parts = [self.literals[0]]
+        for name, literal in zip(self.names, self.literals[1:]):
+            parts.append(data[name])
+            parts.append(literal)
+
+        return ''.join(parts)